@@ -10,9 +10,22 @@ from __future__ import annotations
 
 import argparse
 import json
+import mmap
+import multiprocessing
+import os
 import re
+import string
+import threading
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import orjson
+
+try:
+    import ahocorasick
+except ImportError:  # optional; canonicalize_location falls back to a linear alias scan
+    ahocorasick = None
 
 
 BASE = Path(__file__).resolve().parent
@@ -31,6 +44,40 @@ DEFAULT_PROMPT_TEMPLATE = (
     "JSON:"
 )
 
+LEAD_IN_RE = re.compile(
+    r"^[A-Za-z0-9 /&'.-]+\s+"
+    r"(?:picked\s+up\s+(?:this\s+morning|earlier\s+today|today)?\s+at"
+    r"|picked\s+up\s+at"
+    r"|picked\s+up\s+from"
+    r"|took\s+(?:directly\s+)?from)"
+    r"\s+(.+)$",
+    re.IGNORECASE,
+)
+FROM_PREFIX_RE = re.compile(r"^\s*from\s+", re.IGNORECASE)
+TRAILING_TOOK_RE = re.compile(r"\btook\b\s*$", re.IGNORECASE)
+MIXED_FRACTION_RE = re.compile(r"^(?P<whole>\d+)\s+(?P<num>\d+)/(?P<den>\d+)$")
+SIMPLE_FRACTION_RE = re.compile(r"^(?P<num>\d+)/(?P<den>\d+)$")
+
+MISSING = object()
+
+# canonicalize(value, already_canonical=False) -> Optional[str]
+Canonicalizer = Callable[..., Optional[str]]
+
+
+class _LocationKeyTable(dict):
+    """str.translate table that keeps [a-z0-9 ] and maps every other character to a space."""
+
+    def __missing__(self, codepoint: int) -> str:
+        return " "
+
+
+LOCATION_KEY_CHARS = string.ascii_lowercase + string.digits + " "
+LOCATION_KEY_TABLE = _LocationKeyTable({ord(ch): ch for ch in LOCATION_KEY_CHARS})
+# Byte-level equivalent for ASCII input: lowercase A-Z, keep [a-z0-9 ], everything else becomes a space.
+LOCATION_KEY_BYTES = bytes(
+    ord(ch.lower()) if ch.lower() in LOCATION_KEY_CHARS else ord(" ") for ch in map(chr, range(256))
+)
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Export audited Slack records to PEFT JSONL.")
@@ -70,6 +117,12 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Use raw location fields instead of *_canonical when present",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes for building rows (1 keeps everything in-process)",
+    )
     return parser.parse_args()
 
 
@@ -81,14 +134,15 @@ def string_or_none(value: Any) -> Optional[str]:
 
 
 def normalize_location_key(value: Any) -> str:
-    clean = re.sub(r"[^a-z0-9 ]+", " ", str(value or "").lower()).strip()
-    clean = re.sub(r"\s+", " ", clean)
-    return clean
+    text = str(value or "")
+    if text.isascii():
+        return b" ".join(text.encode("ascii").translate(LOCATION_KEY_BYTES).split()).decode("ascii")
+    return " ".join(text.lower().translate(LOCATION_KEY_TABLE).split())
 
 
 def load_location_aliases(path: Path) -> Dict[str, str]:
     try:
-        data = json.loads(path.read_text())
+        data = orjson.loads(path.read_bytes())
     except FileNotFoundError:
         return {}
     except Exception:
@@ -113,20 +167,39 @@ def strip_location_lead_ins(value: Any) -> str:
     cleaned = string_or_none(value) or ""
     if not cleaned:
         return ""
-    patterns = [
-        r"^[A-Za-z0-9 /&'.-]+\s+picked\s+up\s+(?:this\s+morning|earlier\s+today|today)?\s+at\s+(.+)$",
-        r"^[A-Za-z0-9 /&'.-]+\s+picked\s+up\s+at\s+(.+)$",
-        r"^[A-Za-z0-9 /&'.-]+\s+picked\s+up\s+from\s+(.+)$",
-        r"^[A-Za-z0-9 /&'.-]+\s+took\s+(?:directly\s+)?from\s+(.+)$",
-    ]
-    for pat in patterns:
-        match = re.match(pat, cleaned, flags=re.IGNORECASE)
-        if match:
-            return match.group(1).strip().lstrip("-:").strip()
+    match = LEAD_IN_RE.match(cleaned)
+    if match:
+        return match.group(1).strip().lstrip("-:").strip()
     return cleaned
 
 
-def canonicalize_location(value: Any, alias_lookup: Dict[str, str]) -> Optional[str]:
+def build_alias_matcher(alias_lookup: Dict[str, str]) -> Optional[Any]:
+    """Build an Aho-Corasick automaton over alias keys, tagged with their lookup order."""
+    # Aliases may match anywhere inside a key, so a prefix trie (marisa-trie, datrie) would need a
+    # probe per suffix of the key; the automaton finds every contained alias in one pass instead.
+    if ahocorasick is None or not alias_lookup:
+        return None
+    automaton = ahocorasick.Automaton()
+    for order, (alias_key, canonical) in enumerate(alias_lookup.items()):
+        if alias_key:
+            automaton.add_word(alias_key, (order, canonical))
+    automaton.make_automaton()
+    return automaton
+
+
+def strip_trailing_punct(text: str) -> str:
+    """Drop a trailing run of [:;,-] and the whitespace around it, using str methods only."""
+    stripped = text.rstrip()
+    if not stripped or stripped[-1] not in ":;,-":
+        return text
+    return stripped.rstrip(":;,-").rstrip()
+
+
+def canonicalize_location(
+    value: Any,
+    alias_lookup: Dict[str, str],
+    alias_matcher: Optional[Any] = None,
+) -> Optional[str]:
     cleaned = strip_location_lead_ins(value)
     if not cleaned:
         return None
@@ -138,11 +211,11 @@ def canonicalize_location(value: Any, alias_lookup: Dict[str, str]) -> Optional[
             cleaned = after.strip(" :-")
 
     trimmed = cleaned
-    trimmed = re.sub(r"^\s*from\s+", "", trimmed, flags=re.IGNORECASE)
+    trimmed = FROM_PREFIX_RE.sub("", trimmed)
     trimmed = trimmed.split("\n")[0]
     trimmed = trimmed.split("(")[0]
-    trimmed = re.sub(r"\s*[:;,-]+\s*$", "", trimmed)
-    trimmed = re.sub(r"\btook\b\s*$", "", trimmed, flags=re.IGNORECASE).strip()
+    trimmed = strip_trailing_punct(trimmed)
+    trimmed = TRAILING_TOOK_RE.sub("", trimmed).strip()
     if not trimmed:
         return None
 
@@ -151,12 +224,38 @@ def canonicalize_location(value: Any, alias_lookup: Dict[str, str]) -> Optional[
         alias = alias_lookup.get(key)
         if alias:
             return alias
-        for alias_key, canonical in alias_lookup.items():
-            if alias_key and alias_key in key:
-                return canonical
+        if alias_matcher is not None:
+            # Same result as the scan below: the earliest alias (in lookup order) contained in key.
+            hit = min((found for _, found in alias_matcher.iter(key)), default=None)
+            if hit:
+                return hit[1]
+        else:
+            for alias_key, canonical in alias_lookup.items():
+                if alias_key and alias_key in key:
+                    return canonical
     return trimmed
 
 
+def make_location_canonicalizer(alias_lookup: Dict[str, str]) -> Canonicalizer:
+    """Return a memoized canonicalize_location bound to one alias table."""
+    alias_matcher = build_alias_matcher(alias_lookup)
+    canonical_values = frozenset(alias_lookup.values())
+
+    @lru_cache(maxsize=8192)
+    def _canonicalize(text: str) -> Optional[str]:
+        return canonicalize_location(text, alias_lookup, alias_matcher)
+
+    def canonicalize(value: Any, already_canonical: bool = False) -> Optional[str]:
+        if value is None:
+            return None
+        # *_canonical fields that already name a known location need no cleanup.
+        if already_canonical and isinstance(value, str) and value in canonical_values:
+            return value
+        return _canonicalize(str(value))
+
+    return canonicalize
+
+
 def number_or_none(value: Any) -> Optional[float]:
     if value is None:
         return None
@@ -167,7 +266,12 @@ def number_or_none(value: Any) -> Optional[float]:
     text = str(value).strip().replace(",", "")
     if not text:
         return None
-    fraction_match = re.match(r"^(?P<whole>\d+)\s+(?P<num>\d+)/(?P<den>\d+)$", text)
+    # Plain numbers are the common case; only fall back to the fraction patterns when float() rejects the text.
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    fraction_match = MIXED_FRACTION_RE.match(text)
     if fraction_match:
         whole = float(fraction_match.group("whole"))
         num = float(fraction_match.group("num"))
@@ -175,35 +279,34 @@ def number_or_none(value: Any) -> Optional[float]:
         if den:
             return whole + (num / den)
         return None
-    simple_fraction = re.match(r"^(?P<num>\d+)/(?P<den>\d+)$", text)
+    simple_fraction = SIMPLE_FRACTION_RE.match(text)
     if simple_fraction:
         num = float(simple_fraction.group("num"))
         den = float(simple_fraction.group("den"))
         return num / den if den else None
-    try:
-        return float(text)
-    except ValueError:
-        return None
+    return None
 
 
 def normalize_item(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     if not isinstance(item, dict):
         return None
-    name = string_or_none(item.get("name") or item.get("item_name"))
+    get = item.get
+    name = string_or_none(get("name") or get("item_name"))
     if not name:
         return None
-    quantity = number_or_none(item.get("quantity") if "quantity" in item else item.get("qty"))
-    unit = string_or_none(item.get("unit") or item.get("container"))
-    estimated_lbs = number_or_none(
-        item.get("estimated_lbs") if "estimated_lbs" in item else item.get("pounds")
-    )
-    subcategory = string_or_none(item.get("subcategory") or item.get("category"))
+    # quantity/estimated_lbs win whenever the key is present, even if null.
+    quantity = get("quantity", MISSING)
+    if quantity is MISSING:
+        quantity = get("qty")
+    estimated_lbs = get("estimated_lbs", MISSING)
+    if estimated_lbs is MISSING:
+        estimated_lbs = get("pounds")
     return {
         "name": name,
-        "quantity": quantity,
-        "unit": unit,
-        "estimated_lbs": estimated_lbs,
-        "subcategory": subcategory,
+        "quantity": number_or_none(quantity),
+        "unit": string_or_none(get("unit") or get("container")),
+        "estimated_lbs": number_or_none(estimated_lbs),
+        "subcategory": string_or_none(get("subcategory") or get("category")),
     }
 
 
@@ -221,7 +324,7 @@ def normalize_items(raw_items: Any) -> List[Dict[str, Any]]:
 def normalize_sections(
     raw_sections: Any,
     use_canonical: bool,
-    alias_lookup: Dict[str, str],
+    canonicalize: Canonicalizer,
 ) -> List[Dict[str, Any]]:
     if not isinstance(raw_sections, list):
         return []
@@ -229,11 +332,11 @@ def normalize_sections(
     for section in raw_sections:
         if not isinstance(section, dict):
             continue
-        location_value = None
-        if use_canonical:
-            location_value = section.get("location_canonical")
-        location_value = location_value or section.get("location")
-        location = canonicalize_location(location_value, alias_lookup)
+        canonical_value = section.get("location_canonical") if use_canonical else None
+        if canonical_value:
+            location = canonicalize(canonical_value, already_canonical=True)
+        else:
+            location = canonicalize(section.get("location"))
         items = normalize_items(section.get("items"))
         if not items and not location:
             continue
@@ -244,8 +347,8 @@ def normalize_sections(
 def get_input_text(record: Dict[str, Any]) -> str:
     raw_messages = record.get("raw_messages")
     if isinstance(raw_messages, list):
-        parts = [str(msg).strip() for msg in raw_messages if str(msg).strip()]
-        return "\n\n".join(parts).strip()
+        parts = [part for part in (str(msg).strip() for msg in raw_messages) if part]
+        return "\n\n".join(parts)
     if raw_messages:
         return str(raw_messages).strip()
     raw_text = record.get("raw_text") or record.get("raw_message") or ""
@@ -256,45 +359,70 @@ def select_location(
     record: Dict[str, Any],
     key: str,
     use_canonical: bool,
-    alias_lookup: Dict[str, str],
+    canonicalize: Canonicalizer,
 ) -> Optional[str]:
-    value = None
     if use_canonical:
         value = record.get(f"{key}_canonical")
-    value = value or record.get(key)
-    return canonicalize_location(value, alias_lookup)
+        if value:
+            return canonicalize(value, already_canonical=True)
+    return canonicalize(record.get(key))
+
+
+def split_prompt_template(template: str) -> Tuple[str, str]:
+    """Split a prompt template around its {input_text} placeholder."""
+    prefix, suffix = template.split("{input_text}", 1)
+    return prefix, suffix
+
+
+def iter_lines(path: Path) -> Iterable[bytes]:
+    """Yield non-blank lines from a memory-mapped file."""
+    with path.open("rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            while start < size:
+                end = mm.find(b"\n", start)
+                if end == -1:
+                    end = size
+                line = mm[start:end]
+                start = end + 1
+                if line.strip():
+                    yield line
 
 
 def iter_records(path: Path) -> Iterable[Dict[str, Any]]:
-    with path.open() as f:
-        for line in f:
-            clean = line.strip()
-            if not clean:
-                continue
-            try:
-                yield json.loads(clean)
-            except json.JSONDecodeError:
-                continue
+    for line in iter_lines(path):
+        try:
+            yield orjson.loads(line)
+        except orjson.JSONDecodeError:
+            continue
 
 
 def build_row(
     record: Dict[str, Any],
-    prompt_template: str,
+    prompt_parts: Tuple[str, str],
     use_canonical: bool,
-    alias_lookup: Dict[str, str],
+    canonicalize: Canonicalizer,
 ) -> Optional[Dict[str, Any]]:
     input_text = get_input_text(record)
     if not input_text:
         return None
 
-    sections = normalize_sections(record.get("sections"), use_canonical=use_canonical, alias_lookup=alias_lookup)
+    rescue_location = select_location(record, "rescue_location", use_canonical, canonicalize)
+    drop_off_location = select_location(record, "drop_off_location", use_canonical, canonicalize)
+
+    raw_sections = record.get("sections")
+    sections = (
+        normalize_sections(raw_sections, use_canonical=use_canonical, canonicalize=canonicalize)
+        if isinstance(raw_sections, list) and raw_sections
+        else []
+    )
     if not sections:
         items = normalize_items(record.get("items"))
         if items:
-            location = select_location(record, "drop_off_location", use_canonical, alias_lookup) or select_location(
-                record, "rescue_location", use_canonical, alias_lookup
-            )
-            sections = [{"location": location, "items": items}]
+            sections = [{"location": drop_off_location or rescue_location, "items": items}]
         else:
             sections = []
 
@@ -303,8 +431,6 @@ def build_row(
         flat_items.extend(section.get("items") or [])
 
     direction = string_or_none(record.get("direction"))
-    rescue_location = select_location(record, "rescue_location", use_canonical, alias_lookup)
-    drop_off_location = select_location(record, "drop_off_location", use_canonical, alias_lookup)
 
     target = {
         "direction": direction,
@@ -314,7 +440,8 @@ def build_row(
         "items": flat_items,
     }
 
-    prompt = prompt_template.format(input_text=input_text.strip())
+    prefix, suffix = prompt_parts
+    prompt = prefix + input_text.strip() + suffix
     row_id = record.get("id") or record.get("message_key") or record.get("slack_ts")
     created_at = record.get("audited_at") or record.get("start_ts") or record.get("end_ts")
 
@@ -323,6 +450,8 @@ def build_row(
         "created_at": created_at,
         "input_text": input_text,
         "prompt": prompt,
+        # json.dumps on purpose: this string is the training target, and its spacing is
+        # the output format adapters learn. orjson would emit compact JSON instead.
         "response": json.dumps(target, ensure_ascii=False),
         "target": target,
         "meta": {
@@ -333,6 +462,96 @@ def build_row(
     }
 
 
+def export_record(
+    record: Dict[str, Any],
+    prompt_parts: Tuple[str, str],
+    use_canonical: bool,
+    canonicalize: Canonicalizer,
+    include_empty: bool,
+) -> Tuple[str, Optional[bytes]]:
+    """Build and serialize one row. Status is "ok", "empty" or "no_text"."""
+    row = build_row(record, prompt_parts, use_canonical=use_canonical, canonicalize=canonicalize)
+    if not row:
+        return "no_text", None
+    if not row["target"]["items"] and not include_empty:
+        return "empty", None
+    # "response" is already the serialized target; splice it in instead of encoding the target twice.
+    row["target"] = orjson.Fragment(row["response"])
+    return "ok", orjson.dumps(row)
+
+
+# Per-process export settings, populated by _init_worker in each pool worker.
+_WORKER_OPTIONS: Dict[str, Any] = {}
+
+
+def _init_worker(prompt_parts: Tuple[str, str], use_canonical: bool, alias_lookup: Dict[str, str], include_empty: bool) -> None:
+    _WORKER_OPTIONS.update(
+        prompt_parts=prompt_parts,
+        use_canonical=use_canonical,
+        canonicalize=make_location_canonicalizer(alias_lookup),
+        include_empty=include_empty,
+    )
+
+
+def _export_line(line: bytes) -> Tuple[str, Optional[bytes]]:
+    try:
+        record = orjson.loads(line)
+    except orjson.JSONDecodeError:
+        return "invalid", None
+    return export_record(record, **_WORKER_OPTIONS)
+
+
+def iter_export_results(
+    input_path: Path,
+    prompt_parts: Tuple[str, str],
+    use_canonical: bool,
+    alias_lookup: Dict[str, str],
+    include_empty: bool,
+    workers: int = 1,
+    max_records: Optional[int] = None,
+) -> Iterator[Tuple[str, Optional[bytes]]]:
+    """Yield export_record results in input order, fanning out to a process pool when workers > 1.
+
+    Stops reading input once max_records "ok" rows have been yielded.
+    """
+    exported = 0
+    if workers <= 1:
+        canonicalize = make_location_canonicalizer(alias_lookup)
+        for record in iter_records(input_path):
+            result = export_record(record, prompt_parts, use_canonical, canonicalize, include_empty)
+            yield result
+            if result[0] == "ok":
+                exported += 1
+                if max_records and exported >= max_records:
+                    return
+        return
+
+    # The pool's task-handler thread pulls lines from this generator; setting
+    # stop ends the input so close()/join() can shut the pool down cleanly
+    # instead of terminate() racing a feeder blocked on a full task queue.
+    stop = threading.Event()
+
+    def feed_lines() -> Iterator[bytes]:
+        for line in iter_lines(input_path):
+            if stop.is_set():
+                return
+            yield line
+
+    initargs = (prompt_parts, use_canonical, alias_lookup, include_empty)
+    pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=initargs)
+    try:
+        for result in pool.imap(_export_line, feed_lines(), chunksize=256):
+            yield result
+            if result[0] == "ok":
+                exported += 1
+                if max_records and exported >= max_records:
+                    return
+    finally:
+        stop.set()
+        pool.close()
+        pool.join()
+
+
 def main() -> None:
     args = parse_args()
     input_path = Path(args.input)
@@ -341,6 +560,7 @@ def main() -> None:
 
     if "{input_text}" not in args.prompt_template:
         raise SystemExit("Prompt template must include {input_text} placeholder.")
+    prompt_parts = split_prompt_template(args.prompt_template)
 
     if not input_path.exists():
         raise SystemExit(f"Missing input file: {input_path}")
@@ -348,35 +568,36 @@ def main() -> None:
     exported = 0
     skipped_empty = 0
     skipped_text = 0
-    rows: List[str] = []
 
     use_canonical = not args.no_canonical
     alias_lookup: Dict[str, str] = {}
     if alias_path:
         alias_lookup = load_location_aliases(alias_path)
 
-    for record in iter_records(input_path):
-        row = build_row(
-            record,
-            args.prompt_template,
-            use_canonical=use_canonical,
-            alias_lookup=alias_lookup,
-        )
-        if not row:
-            skipped_text += 1
-            continue
-        has_items = bool(row["items"])
-        if not has_items and not args.include_empty:
-            skipped_empty += 1
-            continue
-        rows.append(json.dumps(row, ensure_ascii=False))
-        exported += 1
-        if args.max_records and exported >= args.max_records:
-            break
-
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    payload = "\n".join(rows)
-    output_path.write_text(f"{payload}\n" if payload else "", encoding="utf-8")
+    results = iter_export_results(
+        input_path,
+        prompt_parts,
+        use_canonical=use_canonical,
+        alias_lookup=alias_lookup,
+        include_empty=args.include_empty,
+        workers=args.workers,
+        max_records=args.max_records,
+    )
+    # The 1 MiB buffer already coalesces rows into large write(2) calls, so no manual writev batching.
+    with output_path.open("wb", buffering=1 << 20) as out:
+        for status, payload in results:
+            if status == "no_text":
+                skipped_text += 1
+                continue
+            if status == "empty":
+                skipped_empty += 1
+                continue
+            if payload is None:
+                continue
+            out.write(payload)
+            out.write(b"\n")
+            exported += 1
 
     print(
         f"Exported {exported} rows to {output_path} "
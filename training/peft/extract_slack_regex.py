@@ -15,18 +15,30 @@ from __future__ import annotations
 import argparse
 import json
 import re
+import string
 import sys
 import zipfile
 from collections import Counter, defaultdict
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 import xml.etree.ElementTree as ET
 
+import orjson
 
+try:
+  import ahocorasick
+except ImportError:  # optional; the keyword matchers fall back to substring checks
+  ahocorasick = None
+
+
+# Explicit __slots__ (rather than dataclass(slots=True), which needs 3.10)
+# drops the per-instance __dict__ for these high-volume rows.
 @dataclass
 class MessageRow:
+  __slots__ = ("ts", "dt", "user", "text", "msg_type", "subtype", "thread_ts", "reply_count")
   ts: str
   dt: Optional[datetime]
   user: str
@@ -39,12 +51,22 @@ class MessageRow:
 
 @dataclass
 class ParsedItem:
+  __slots__ = ("name", "quantity", "unit", "estimated_lbs", "subcategory")
   name: str
   quantity: Optional[float]
   unit: Optional[str]
   estimated_lbs: Optional[float]
   subcategory: str
 
+  def as_dict(self) -> Dict[str, Any]:
+    return {
+      "name": self.name,
+      "quantity": self.quantity,
+      "unit": self.unit,
+      "estimated_lbs": self.estimated_lbs,
+      "subcategory": self.subcategory,
+    }
+
 
 NUMBER_WORDS: Dict[str, float] = {
   "zero": 0,
@@ -122,6 +144,64 @@ def load_weight_config() -> Dict[str, Any]:
 
 WEIGHT_CONFIG = load_weight_config()
 
+ITEM_SPECIFIC_WEIGHTS: List[Tuple[str, Dict[str, float]]] = list(WEIGHT_CONFIG.get("item_specific", {}).items())
+# (food_weights bucket, base weight key) in precedence order; seafood is priced as meat.
+FOOD_WEIGHT_BUCKETS: List[Tuple[str, str]] = [
+  ("produce_heavy", "produce_heavy"),
+  ("produce_light", "produce_light"),
+  ("meat", "meat"),
+  ("dairy", "dairy"),
+  ("seafood", "meat"),
+]
+
+
+def build_weight_matcher() -> Optional[Any]:
+  """Aho-Corasick automaton over item_specific and food_weights keywords.
+
+  Each keyword maps to [item_specific rank or None, food bucket rank or None].
+  """
+  if ahocorasick is None:
+    return None
+  keywords: Dict[str, List[Optional[int]]] = {}
+  for rank, (keyword, _) in enumerate(ITEM_SPECIFIC_WEIGHTS):
+    keywords.setdefault(keyword, [None, None])[0] = rank
+  food_map = WEIGHT_CONFIG.get("food_weights", {})
+  for rank, (bucket, _) in enumerate(FOOD_WEIGHT_BUCKETS):
+    for token in food_map.get(bucket, []):
+      entry = keywords.setdefault(token, [None, None])
+      if entry[1] is None:
+        entry[1] = rank
+  if "" in keywords:
+    return None  # an empty keyword matches every name; leave it to the plain scan
+  automaton = ahocorasick.Automaton()
+  for keyword, ranks in keywords.items():
+    automaton.add_word(keyword, tuple(ranks))
+  automaton.make_automaton()
+  return automaton
+
+
+WEIGHT_MATCHER = build_weight_matcher()
+
+
+def match_weight_keywords(name_norm: str) -> Tuple[List[int], Optional[int]]:
+  """Return the item_specific ranks found in name_norm (ascending) and the first food bucket hit."""
+  if WEIGHT_MATCHER is not None:
+    item_ranks = set()
+    food_rank = None
+    for _, (item_rank, bucket_rank) in WEIGHT_MATCHER.iter(name_norm):
+      if item_rank is not None:
+        item_ranks.add(item_rank)
+      if bucket_rank is not None and (food_rank is None or bucket_rank < food_rank):
+        food_rank = bucket_rank
+    return sorted(item_ranks), food_rank
+
+  item_ranks = [rank for rank, (keyword, _) in enumerate(ITEM_SPECIFIC_WEIGHTS) if keyword in name_norm]
+  food_map = WEIGHT_CONFIG.get("food_weights", {})
+  for rank, (bucket, _) in enumerate(FOOD_WEIGHT_BUCKETS):
+    if any(tok in name_norm for tok in food_map.get(bucket, [])):
+      return item_ranks, rank
+  return item_ranks, None
+
 ITEM_PATTERN = re.compile(
   r"""
   ^\s*                            # start of segment
@@ -132,12 +212,14 @@ ITEM_PATTERN = re.compile(
   (?:                             # optional size adjectives before unit
     (?:small|sm|large|lrg|big)\s+
   )?
-  (?P<unit>                       # optional unit
-    cs|cases?|boxes?|box|bins?|bags?|shopping\s+bags?|totes?|crates?|flats?|pkgs?|packages?|pallets?|pallet|
-    lbs?|pounds?|gals?|gallons?|gal|
-    dozen|dz|
-    bottle?s?|cans?|loaves?|loaf|bunch(?:es)?|trays?|jars?|clamshells?|
-    pkg|bag|crate|flat|bin|tote|box
+  (?P<unit>                       # optional unit, one entry per spelling,
+    (?:                           # longest first where spellings share a prefix
+      shopping\s+bags?|clamshells?|
+      packages?|pallets?|gallons?|gals?|bunch(?:es)?|bottle?s?|loaves|loaf|
+      dozen|dz|cases?|cs|box(?:es)?|bins?|bags?|totes?|crates?|flats?|pkgs?|
+      lbs?|pounds?|cans?|trays?|jars?
+    )
+    (?![a-z])                     # whole words only ("canned" is not "can")
   )?
   \s*
   (?:of\s+)?                      # optional "of"
@@ -147,13 +229,119 @@ ITEM_PATTERN = re.compile(
   re.IGNORECASE | re.VERBOSE,
 )
 
-LINE_SPLIT_RE = re.compile(r"[|;/,]+|\n+")
-AND_SPLIT_RE = re.compile(r"\b(?:and|&)\b")
+# Line breaks, bullets and list punctuation, or a bare "and"/"&" between words.
+SEGMENT_SPLIT_RE = re.compile(r"[|;/,•\n]+|\b(?:and|&)\b")
+
+NUMBER_WORD_RE = re.compile(r"\b(zero|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|half)\b", re.IGNORECASE)
+LOC_TRAILING_PUNCT_RE = re.compile(r"[;,.]+$")
+WHITESPACE_RE = re.compile(r"\s+")
+DASH_RE = re.compile(r"\s[-–—]\s")
+DROP_FROM_RE = re.compile(r"(?:dropped\s+off\s+from|dropped\s+from|drop\s+off\s+from)\s+(.+)", re.IGNORECASE)
+RESCUE_RE = re.compile(
+  r"(?:picked\s+up\s+(?:some\s+)?(?:produce\s+)?from|rescued\s+from|rescue\s+from|pickup(?:ed)?\s+from|earlier\s+today\s+from|today\s+from|scooped\s+(?:this\s+)?from)\s+(.+)",
+  re.IGNORECASE,
+)
+TRAILING_IN_RE = re.compile(r'\s+in\s+\w+$', re.IGNORECASE)
+SIMPLE_FROM_RE = re.compile(r"^(?:from|From)\s+([A-Z][A-Za-z0-9 &''-]{2,})")
+DROPOFF_PATTERNS = [
+  re.compile(r"(?:dropped\s+off|dropped)\s+(?:at|to|surplus\s+at)\s+(.+)", re.IGNORECASE),
+  re.compile(r"(?:delivered|deliver|delivering)\s+(?:to|at)\s+(.+)", re.IGNORECASE),
+  re.compile(r"(?:brought|bringing|took|taking|sent|sending)\s+(?:to|at)\s+(.+)", re.IGNORECASE),
+  re.compile(r"(?:taken\s+to|going\s+to)\s+(.+)", re.IGNORECASE),
+  re.compile(r"\bfor\s+([A-Z][A-Za-z0-9 &'-]{2,})", re.IGNORECASE),  # e.g., "grabbed X for LSRSN"
+  re.compile(r"^([A-Za-z0-9 &'-]{2,})\s+(?:took|grabbed|picked\s+up)\b", re.IGNORECASE),  # e.g., "NA4J took ..."
+  re.compile(r"(?:claimed|labeled)\s+for\s+([A-Z][A-Za-z0-9 &'-]{2,})", re.IGNORECASE),  # e.g., "claimed for WSMA"
+]
+# One scan over the text finds the leftmost drop-off phrase; the lastindex of
+# the match is the wrapper group of the pattern that fired.
+DROPOFF_COMBINED_RE = re.compile(
+  "|".join(f"(?P<p{i}>{pat.pattern})" for i, pat in enumerate(DROPOFF_PATTERNS)),
+  re.IGNORECASE,
+)
+DROPOFF_GROUP_INDEX = {DROPOFF_COMBINED_RE.groupindex[f"p{i}"]: i for i in range(len(DROPOFF_PATTERNS))}
+# Every drop-off pattern (and the "taken to ... fridge" fallback) needs one of
+# these words, so a text without any of them cannot yield a location.
+DROPOFF_KEYWORDS = (
+  "dropped", "deliver", "brought", "bringing", "took", "taking", "sent", "sending",
+  "taken", "going", "grabbed", "picked", "for",
+)
+# re.IGNORECASE also matches these non-ASCII letters against i, k and s.
+KEYWORD_FOLD_TABLE = str.maketrans({"\u0130": "i", "\u0131": "i", "\u212a": "k", "\u017f": "s"})
+TRAILING_AND_RE = re.compile(r'\s+and\s+.*$')
+SECTION_HEADING_RE = re.compile(r"^([A-Za-z0-9 /&'’.-]+):\s*$")
+LEADING_NON_DIGIT_RE = re.compile(r"^[^0-9~]*")
+PAREN_TAIL_RE = re.compile(r"\(([^)]{1,80})\)\s*$")
+STORAGE_SUFFIX_RE = re.compile(r"\b(?:in|on|inside)\s+(?:the\s+)?(?:cooler|freezer|fridge|fridges?)\b", re.IGNORECASE)
+TRAILING_UNIT_RE = re.compile(r"^(?P<item>.+?)\s+(?P<unit>boxes?|box|cases?|case|crates?|totes?|bins?|bags?)$", re.IGNORECASE)
+LEADING_BAG_RE = re.compile(r"^(?:big|large|lrg)?\s*bags?\b\s+(.*)$", re.IGNORECASE)
+LEADING_SIZE_RE = re.compile(r"^(?:big|large|lrg)\s+", re.IGNORECASE)
+BIG_BAGS_RE = re.compile(r"\bbig\s+bags?\s+", re.IGNORECASE)
+BAG_WORD_RE = re.compile(r"\bbags?\b", re.IGNORECASE)
+SIZED_SPLIT_PEAS_RE = re.compile(r"^(?:big|large|small|lrg)\s+(split\s+peas?)", re.IGNORECASE)
+MULTI_SPACE_RE = re.compile(r"\s{2,}")
+AM_PM_RE = re.compile(r"\b(am|pm)\b")
+
+SEGMENT_SKIP_RE = re.compile(r"^<?http|google\.com/maps|<@")
+# Names mentioning any of these are chatter (links, logistics), not food.
+NAME_SKIP_RE = re.compile(
+  "|".join(
+    re.escape(token)
+    for token in [
+      "<@", "http", "google", "docs.google", "guide", "meeting", "channel", "thermometer", "dumpster", "door",
+      "code", "recycling", "compost", "cardboard", "loading", "schedule",
+    ]
+  )
+)
+TYPO_MAP: Dict[str, str] = {
+  "brocolli": "broccoli",
+  "brussel sprouts": "brussels sprouts",
+}
+# Deleting a-z leaves everything else, so the length drop is the a-z letter count.
+DROP_ASCII_LOWER_TABLE = str.maketrans("", "", string.ascii_lowercase)
+
+# Checked in order; the first category with a matching token wins.
+CATEGORY_KEYWORDS: List[Tuple[str, List[str]]] = [
+  ("drinks", ["water", "juice", "soda", "coffee", "tea", "latte", "drink", "beverage", "milk", "kombucha", "sparkling", "sports drink", "coconut water"]),
+  ("snacks", ["snack", "chips", "cracker", "pretzel", "cookie", "popcorn", "granola", "trail mix", "protein bar", "granola bar", "candy", "nuts", "almond", "peanut", "cashew", "pistachio"]),
+  ("produce", ["apple", "orange", "banana", "little banana", "berry", "grape", "melon", "clementine", "fruit", "green", "greens", "lettuce", "cabbage", "potato", "onion", "pepper", "tomato", "carrot", "spinach", "produce", "vegetable", "brussel", "brussels", "pear", "lemon", "grapefruit", "guava", "cuke", "cucumber", "bean", "split pea", "broccoli", "brocolli"]),
+  ("grain", ["bread", "loaf", "loaves", "rice", "pasta", "grain", "tortilla", "dessert", "cake", "bun"]),
+  ("meat", ["chicken", "beef", "pork", "turkey", "meat", "steak", "sausage", "ribs"]),
+  ("dry goods", ["canned", "dry goods", "pantry", "shelf stable", "flour", "sugar", "salt", "spice", "seasoning", "oil", "vinegar", "beans", "lentil", "lentils", "chickpea", "oat", "oats", "oatmeal", "cereal", "broth", "stock", "sauce", "condiment"]),
+  ("dairy", ["milk", "cheese", "yogurt", "butter", "cream", "half and half", "cottage cheese", "sour cream", "kefir"]),
+  ("seafood", ["scallop", "scallops", "fish", "shrimp", "salmon", "tuna"]),
+]
+
+
+def build_category_matcher() -> Optional[Any]:
+  """Aho-Corasick automaton over every category token, valued (rank, category)."""
+  if ahocorasick is None:
+    return None
+  automaton = ahocorasick.Automaton()
+  for rank, (category, tokens) in enumerate(CATEGORY_KEYWORDS):
+    for token in tokens:
+      # Tokens listed under several categories keep their highest-priority one.
+      if token not in automaton:
+        automaton.add_word(token, (rank, category))
+  automaton.make_automaton()
+  return automaton
+
 
+CATEGORY_MATCHER = build_category_matcher()
 
+
+@lru_cache(maxsize=16384)
 def parse_iso(ts: str) -> Optional[datetime]:
   if not ts:
     return None
+  # Common Slack shape: a date-time with a single trailing "Z". Parse the naive
+  # part and attach UTC instead of building a "+00:00" copy of the string.
+  if ts[-1] == "Z" and ts.count("Z") == 1 and ("T" in ts or " " in ts):
+    try:
+      parsed = datetime.fromisoformat(ts[:-1])
+    except ValueError:
+      parsed = None
+    if parsed is not None and parsed.tzinfo is None:
+      return parsed.replace(tzinfo=timezone.utc)
   try:
     clean = ts.replace("Z", "+00:00")
     return datetime.fromisoformat(clean)
@@ -162,76 +350,99 @@ def parse_iso(ts: str) -> Optional[datetime]:
 
 
 def col_idx(cell_ref: str) -> int:
-  match = re.match(r"([A-Z]+)(\d+)", cell_ref or "")
-  if not match:
-    return 0
-  letters = match.group(1)
+  # Decode the column letters of a ref like "AB12" in one scan; a ref without
+  # leading letters followed by a digit maps to column 0.
   idx = 0
-  for ch in letters:
-    idx = idx * 26 + (ord(ch) - ord("A") + 1)
-  return idx - 1
+  for pos, ch in enumerate(cell_ref or ""):
+    if "A" <= ch <= "Z":
+      idx = idx * 26 + (ord(ch) - 64)
+      continue
+    return idx - 1 if pos and ch.isdecimal() else 0
+  return 0
 
 
 def read_xlsx_messages(path: str) -> List[MessageRow]:
-  with zipfile.ZipFile(path) as zf:
-    sheet = ET.parse(zf.open("xl/worksheets/sheet1.xml")).getroot()
-
   ns = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+  row_tag = f"{ns}row"
   rows: List[MessageRow] = []
   header: List[str] = []
-  for row in sheet.findall(f".//{ns}row"):
-    cells: Dict[int, str] = {}
-    for c in row.findall(f"{ns}c"):
-      ref = c.get("r") or ""
-      idx = col_idx(ref)
-      text = ""
-      if c.get("t") == "inlineStr":
-        is_elem = c.find(f"{ns}is")
-        if is_elem is not None:
-          t_elem = is_elem.find(f"{ns}t")
-          if t_elem is not None:
-            text = "".join(t_elem.itertext())
-      else:
-        v = c.find(f"{ns}v")
-        if v is not None:
-          text = v.text or ""
-      cells[idx] = text
+  columns: Dict[str, int] = {}
+  with zipfile.ZipFile(path) as zf, zf.open("xl/worksheets/sheet1.xml") as sheet:
+    # Stream rows as they close and drop their cells, rather than holding the
+    # whole worksheet tree in memory.
+    for _, row in ET.iterparse(sheet, events=("end",)):
+      if row.tag != row_tag:
+        continue
+      values = read_row_cells(row, ns, width=len(header) if header else None)
+      row.clear()
+      if values is None:
+        continue
+      if not header:
+        header = values
+        # Later duplicate headers win, as they did when rows became dicts.
+        columns = {name: i for i, name in enumerate(header)}
+        continue
+      rows.append(message_row_from_values(columns, values))
+  return rows
 
-    if not cells:
-      continue
-    max_idx = max(cells)
-    row_vals = [""] * (max_idx + 1)
-    for idx, val in cells.items():
-      row_vals[idx] = val
 
-    if not header:
-      header = row_vals
+def read_row_cells(row: ET.Element, ns: str, width: Optional[int] = None) -> Optional[List[str]]:
+  """Cell texts indexed by column, or None for a row without cells.
+
+  With a width (the header length) the list is allocated once and cells past
+  it are skipped; without one it grows to the last populated column.
+  """
+  row_vals: List[str] = [""] * width if width is not None else []
+  has_cells = False
+  for c in row.findall(f"{ns}c"):
+    has_cells = True
+    idx = col_idx(c.get("r") or "")
+    if width is not None and idx >= width:
       continue
+    text = ""
+    if c.get("t") == "inlineStr":
+      is_elem = c.find(f"{ns}is")
+      if is_elem is not None:
+        t_elem = is_elem.find(f"{ns}t")
+        if t_elem is not None:
+          text = "".join(t_elem.itertext())
+    else:
+      v = c.find(f"{ns}v")
+      if v is not None:
+        text = v.text or ""
+    if idx >= len(row_vals):
+      row_vals.extend([""] * (idx + 1 - len(row_vals)))
+    row_vals[idx] = text
+
+  return row_vals if has_cells else None
+
+
+def message_row_from_values(columns: Dict[str, int], row_vals: List[str]) -> MessageRow:
+  def value(name: str) -> str:
+    idx = columns.get(name)
+    return row_vals[idx] if idx is not None else ""
+
+  timestamp = value("Timestamp")
+  return MessageRow(
+    ts=timestamp,
+    dt=parse_iso(timestamp),
+    user=value("User"),
+    text=value("Message") or "",
+    msg_type=value("Type"),
+    subtype=value("Subtype"),
+    thread_ts=value("ThreadTS"),
+    reply_count=value("ReplyCount"),
+  )
 
-    data = {header[i]: row_vals[i] if i < len(row_vals) else "" for i in range(len(header))}
-    rows.append(
-      MessageRow(
-        ts=data.get("Timestamp", ""),
-        dt=parse_iso(data.get("Timestamp", "")),
-        user=data.get("User", ""),
-        text=data.get("Message", "") or "",
-        msg_type=data.get("Type", ""),
-        subtype=data.get("Subtype", ""),
-        thread_ts=data.get("ThreadTS", ""),
-        reply_count=data.get("ReplyCount", ""),
-      ),
-    )
-  return rows
+
+NORMALIZE_TABLE = str.maketrans({"\u00a0": " ", "\r": "\n"})
 
 
 def normalize_text(text: str) -> str:
-  # Slack pastes often contain repeated whitespace or NBSPs
-  return (
-    text.replace("\u00a0", " ")
-    .replace("\r\n", "\n")
-    .replace("\r", "\n")
-    .strip()
-  )
+  # Slack pastes often contain repeated whitespace or NBSPs. "\r\n" has to
+  # collapse before the table maps lone "\r" to "\n", or it would become two
+  # line breaks.
+  return text.replace("\r\n", "\n").translate(NORMALIZE_TABLE).strip()
 
 
 def numberize_words(text: str) -> str:
@@ -239,42 +450,41 @@ def numberize_words(text: str) -> str:
     word = match.group(0).lower()
     return str(NUMBER_WORDS.get(word, match.group(0)))
 
-  return re.sub(r"\b(zero|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|half)\b", repl, text, flags=re.IGNORECASE)
+  return NUMBER_WORD_RE.sub(repl, text)
 
 
 def clean_location(value: str) -> str:
-  cleaned = re.sub(r"[;,.]+$", "", value or "")
-  cleaned = re.sub(r"\s+", " ", cleaned).strip()
+  cleaned = LOC_TRAILING_PUNCT_RE.sub("", value or "")
+  cleaned = WHITESPACE_RE.sub(" ", cleaned).strip()
   return cleaned
 
 
 def extract_rescue_location(text: str) -> str:
-  drop_match = re.search(r"(?:dropped\s+off\s+from|dropped\s+from|drop\s+off\s+from)\s+(.+)", text, flags=re.IGNORECASE)
+  # Every rescue pattern ends in (or starts with) "from".
+  if "from" not in text.lower():
+    return ""
+  drop_match = DROP_FROM_RE.search(text)
   if drop_match:
     remainder = drop_match.group(1).split("\n")[0]
     remainder = remainder.split(":")[0]
-    dash = re.search(r"\s[-–—]\s", remainder)
+    dash = DASH_RE.search(remainder)
     if dash:
       remainder = remainder[: dash.start()]
     return clean_location(remainder)
 
-  match = re.search(
-    r"(?:picked\s+up\s+(?:some\s+)?(?:produce\s+)?from|rescued\s+from|rescue\s+from|pickup(?:ed)?\s+from|earlier\s+today\s+from|today\s+from|scooped\s+(?:this\s+)?from)\s+(.+)",
-    text,
-    flags=re.IGNORECASE,
-  )
+  match = RESCUE_RE.search(text)
   if match:
     remainder = match.group(1).split("\n")[0]
     # Handle "in Englewood" and similar suffixes
-    remainder = re.sub(r'\s+in\s+\w+$', '', remainder, flags=re.IGNORECASE)
+    remainder = TRAILING_IN_RE.sub("", remainder)
     remainder = remainder.split(":")[0]
-    dash_match = re.search(r"\s[-–—]\s", remainder)
+    dash_match = DASH_RE.search(remainder)
     if dash_match:
       remainder = remainder[: dash_match.start()]
     return clean_location(remainder)
 
   # Try simple "from X" pattern at start of message
-  simple_from = re.search(r"^(?:from|From)\s+([A-Z][A-Za-z0-9 &''-]{2,})", text)
+  simple_from = SIMPLE_FROM_RE.search(text)
   if simple_from:
     return clean_location(simple_from.group(1))
 
@@ -282,24 +492,26 @@ def extract_rescue_location(text: str) -> str:
 
 
 def extract_dropoff_location(text: str) -> str:
-  patterns = [
-    r"(?:dropped\s+off|dropped)\s+(?:at|to|surplus\s+at)\s+(.+)",
-    r"(?:delivered|deliver|delivering)\s+(?:to|at)\s+(.+)",
-    r"(?:brought|bringing|took|taking|sent|sending)\s+(?:to|at)\s+(.+)",
-    r"(?:taken\s+to|going\s+to)\s+(.+)",
-    r"\bfor\s+([A-Z][A-Za-z0-9 &'-]{2,})",  # e.g., "grabbed X for LSRSN"
-    r"^([A-Za-z0-9 &'-]{2,})\s+(?:took|grabbed|picked\s+up)\b",  # e.g., "NA4J took ..."
-    r"(?:claimed|labeled)\s+for\s+([A-Z][A-Za-z0-9 &'-]{2,})",  # e.g., "claimed for WSMA"
-  ]
-  for pat in patterns:
-    match = re.search(pat, text, flags=re.IGNORECASE)
-    if match:
-      remainder = match.group(1).split("\n")[0]
-      remainder = remainder.split(";")[0]
-      remainder = remainder.split(",")[0]
-      # Remove trailing "and X" patterns
-      remainder = re.sub(r'\s+and\s+.*$', '', remainder)
-      return clean_location(remainder)
+  folded = text.translate(KEYWORD_FOLD_TABLE).lower()
+  if not any(keyword in folded for keyword in DROPOFF_KEYWORDS):
+    return ""
+  combined = DROPOFF_COMBINED_RE.search(text)
+  if combined:
+    # The leftmost hit may come from a lower-priority pattern; an earlier
+    # pattern that matches further into the text still wins.
+    hit = DROPOFF_GROUP_INDEX[combined.lastindex]
+    remainder = combined.group(combined.lastindex + 1)
+    for pat in DROPOFF_PATTERNS[:hit]:
+      match = pat.search(text)
+      if match:
+        remainder = match.group(1)
+        break
+    remainder = remainder.split("\n")[0]
+    remainder = remainder.split(";")[0]
+    remainder = remainder.split(",")[0]
+    # Remove trailing "and X" patterns
+    remainder = TRAILING_AND_RE.sub("", remainder)
+    return clean_location(remainder)
   if "taken to" in text.lower() and "fridge" in text.lower():
     return "Love Fridge"
   return ""
@@ -311,10 +523,8 @@ def parse_sections(text: str) -> List[Dict[str, Any]]:
   current_loc = None
   buffer: List[str] = []
 
-  heading_re = re.compile(r"^([A-Za-z0-9 /&'’.-]+):\s*$")
-
   for line in lines:
-    heading = heading_re.match(line)
+    heading = SECTION_HEADING_RE.match(line)
     if heading:
       # flush previous
       if current_loc and buffer:
@@ -335,11 +545,67 @@ def parse_sections(text: str) -> List[Dict[str, Any]]:
       continue
     parsed_sections.append({
       "location": clean_location(loc),
-      "items": [item.__dict__ if isinstance(item, ParsedItem) else item for item in chunk_items],
+      "items": [item.as_dict() if isinstance(item, ParsedItem) else item for item in chunk_items],
     })
   return parsed_sections
 
 
+INBOUND_PHRASES = [
+  "rescued from",
+  "rescue from",
+  "picked up from",
+  "pickup from",
+  "picked up at",
+  "today from",
+  "earlier today from",
+  "drop off at uc",  # dropped at warehouse counts as inbound to storage
+  "dropped off at uc",
+  "dropped at uc",
+  "left at uc",
+  "left in the warehouse",
+  "dropped at warehouse",
+  "dropped ",
+  "left in",
+  "left at",
+  "drop off",
+]
+OUTBOUND_PHRASES = [
+  "dropped off",
+  "drop off",
+  "delivered to",
+  "deliver to",
+  "brought to",
+  "took to",
+  "taking to",
+  "grabbed",
+  "grabbed for",
+  "took",
+  "took ",
+  "picked up for",
+  "for distro",
+  "headed to",
+  "delivered",
+  "delivery to",
+  "for love fridge",
+  "for lf",
+  "stocked",
+]
+
+
+def build_direction_matcher() -> Optional[Any]:
+  if ahocorasick is None:
+    return None
+  automaton = ahocorasick.Automaton()
+  # Phrases such as "drop off" sit in both lists and flag both directions.
+  for phrase in set(INBOUND_PHRASES) | set(OUTBOUND_PHRASES):
+    automaton.add_word(phrase, (phrase in INBOUND_PHRASES, phrase in OUTBOUND_PHRASES))
+  automaton.make_automaton()
+  return automaton
+
+
+DIRECTION_MATCHER = build_direction_matcher()
+
+
 def detect_direction(text: str, rescue_loc: str = "", drop_loc: str = "") -> str:
   if rescue_loc and drop_loc:
     return "both"
@@ -349,52 +615,16 @@ def detect_direction(text: str, rescue_loc: str = "", drop_loc: str = "") -> str
     return "outbound"
 
   lower = text.lower()
-  inbound = any(
-    phrase in lower
-    for phrase in [
-      "rescued from",
-      "rescue from",
-      "picked up from",
-      "pickup from",
-      "picked up at",
-      "today from",
-      "earlier today from",
-      "drop off at uc",  # dropped at warehouse counts as inbound to storage
-      "dropped off at uc",
-      "dropped at uc",
-      "left at uc",
-      "left in the warehouse",
-      "dropped at warehouse",
-      "dropped ",
-      "left in",
-      "left at",
-      "drop off",
-    ]
-  )
-  outbound = any(
-    phrase in lower
-    for phrase in [
-      "dropped off",
-      "drop off",
-      "delivered to",
-      "deliver to",
-      "brought to",
-      "took to",
-      "taking to",
-      "grabbed",
-      "grabbed for",
-      "took",
-      "took ",
-      "picked up for",
-      "for distro",
-      "headed to",
-      "delivered",
-      "delivery to",
-      "for love fridge",
-      "for lf",
-      "stocked",
-    ]
-  )
+  if DIRECTION_MATCHER is not None:
+    inbound = outbound = False
+    for _, (is_inbound, is_outbound) in DIRECTION_MATCHER.iter(lower):
+      inbound = inbound or is_inbound
+      outbound = outbound or is_outbound
+      if inbound and outbound:
+        break
+  else:
+    inbound = any(phrase in lower for phrase in INBOUND_PHRASES)
+    outbound = any(phrase in lower for phrase in OUTBOUND_PHRASES)
   if inbound and outbound:
     return "both"
   if inbound:
@@ -405,76 +635,79 @@ def detect_direction(text: str, rescue_loc: str = "", drop_loc: str = "") -> str
 
 
 def split_item_segments(text: str) -> List[str]:
-  text = text.replace("•", "\n")
-  text = LINE_SPLIT_RE.sub("\n", text)
   segments: List[str] = []
-  for block in text.split("\n"):
-    block = block.strip(" -•\t")
-    if not block:
-      continue
-    for part in AND_SPLIT_RE.split(block):
-      part = part.strip(" -•\t")
-      if part:
-        segments.append(part)
+  for part in SEGMENT_SPLIT_RE.split(text):
+    part = part.strip(" -•\t")
+    if part:
+      segments.append(part)
   return segments
 
 
+@lru_cache(maxsize=8192)
 def categorize_item(name: str) -> str:
   lower = name.lower()
-  def has_any(tokens: Iterable[str]) -> bool:
-    return any(token in lower for token in tokens)
-
-  if has_any(["water", "juice", "soda", "coffee", "tea", "latte", "drink", "beverage", "milk", "kombucha", "sparkling", "sports drink", "coconut water"]):
-    return "drinks"
-  if has_any(["snack", "chips", "cracker", "pretzel", "cookie", "popcorn", "granola", "trail mix", "protein bar", "granola bar", "candy", "nuts", "almond", "peanut", "cashew", "pistachio"]):
-    return "snacks"
-  if has_any(["apple", "orange", "banana", "little banana", "berry", "grape", "melon", "clementine", "fruit", "green", "greens", "lettuce", "cabbage", "potato", "onion", "pepper", "tomato", "carrot", "spinach", "produce", "vegetable", "brussel", "brussels", "pear", "lemon", "grapefruit", "guava", "cuke", "cucumber", "bean", "split pea", "broccoli", "brocolli"]):
-    return "produce"
-  if has_any(["bread", "loaf", "loaves", "rice", "pasta", "grain", "tortilla", "dessert", "cake", "bun"]):
-    return "grain"
-  if has_any(["chicken", "beef", "pork", "turkey", "meat", "steak", "sausage", "ribs"]):
-    return "meat"
-  if has_any(["canned", "dry goods", "pantry", "shelf stable", "flour", "sugar", "salt", "spice", "seasoning", "oil", "vinegar", "beans", "lentil", "lentils", "chickpea", "oat", "oats", "oatmeal", "cereal", "broth", "stock", "sauce", "condiment"]):
-    return "dry goods"
-  if has_any(["milk", "cheese", "yogurt", "butter", "cream", "half and half", "cottage cheese", "sour cream", "kefir"]):
-    return "dairy"
-  if has_any(["scallop", "scallops", "fish", "shrimp", "salmon", "tuna"]):
-    return "seafood"
+  if CATEGORY_MATCHER is not None:
+    best = None
+    for _, (rank, category) in CATEGORY_MATCHER.iter(lower):
+      if best is None or rank < best[0]:
+        best = (rank, category)
+    return best[1] if best else ""
+
+  for category, tokens in CATEGORY_KEYWORDS:
+    if any(token in lower for token in tokens):
+      return category
   return ""
 
 
-def estimate_weight(qty: Optional[float], unit: Optional[str], name: str) -> Optional[float]:
-  if qty is None or qty <= 0:
-    return None
-  unit_norm = (unit or "").lower()
-  name_norm = name.lower()
-
+@lru_cache(maxsize=None)
+def unit_fallback_floor(unit_norm: str) -> Optional[float]:
+  # Minimum per-unit weight for units missing from unit_overrides. Only a
+  # handful of distinct units ever reach this, so the chain runs once per unit.
+  if "bag" in unit_norm:
+    return 8
+  if "bin" in unit_norm or "tote" in unit_norm or "crate" in unit_norm:
+    return 25
+  if "box" in unit_norm or "case" in unit_norm or "cs" in unit_norm or "pkg" in unit_norm or "package" in unit_norm:
+    return 15
+  if "flat" in unit_norm:
+    return 12
+  if "gallon" in unit_norm or "gal" in unit_norm:
+    return 8
+  if "dozen" in unit_norm or unit_norm == "dz":
+    return 4
+  if "loaf" in unit_norm:
+    return 0.5
+  if "bottle" in unit_norm or "can" in unit_norm or "jar" in unit_norm:
+    return 2
+  if "tray" in unit_norm or "clamshell" in unit_norm:
+    return 3
+  if "bunch" in unit_norm:
+    return 5
+  if "each" in unit_norm:
+    return 2
+  return None
+
+
+@lru_cache(maxsize=8192)
+def per_unit_weight(unit_norm: str, name_norm: str) -> float:
+  # Everything except the final multiply depends only on the unit and name,
+  # which repeat heavily across a log, so this is cached apart from qty.
   if unit_norm in {"lb", "lbs", "pound", "pounds"}:
-    return round(qty, 2)
+    return 1
 
   base_cfg = WEIGHT_CONFIG.get("base", {})
   per_unit = base_cfg.get("default", 5)
 
+  item_ranks, food_rank = match_weight_keywords(name_norm)
+
   # Check for item-specific weight overrides first
-  item_specific = WEIGHT_CONFIG.get("item_specific", {})
-  for item_keyword, unit_weights in item_specific.items():
-    if item_keyword in name_norm:
-      if unit_norm in unit_weights:
-        per_unit = unit_weights[unit_norm]
-        estimate = round(per_unit * qty, 2)
-        return estimate if estimate >= 0 else None
+  for rank in item_ranks:
+    unit_weights = ITEM_SPECIFIC_WEIGHTS[rank][1]
+    if unit_norm in unit_weights:
+      return unit_weights[unit_norm]
 
-  food_map = WEIGHT_CONFIG.get("food_weights", {})
-  if any(tok in name_norm for tok in food_map.get("produce_heavy", [])):
-    per_unit = base_cfg.get("produce_heavy", per_unit)
-  elif any(tok in name_norm for tok in food_map.get("produce_light", [])):
-    per_unit = base_cfg.get("produce_light", per_unit)
-  elif any(tok in name_norm for tok in food_map.get("meat", [])):
-    per_unit = base_cfg.get("meat", per_unit)
-  elif any(tok in name_norm for tok in food_map.get("dairy", [])):
-    per_unit = base_cfg.get("dairy", per_unit)
-  elif any(tok in name_norm for tok in food_map.get("seafood", [])):
-    per_unit = base_cfg.get("meat", per_unit)
+  if food_rank is not None:
+    per_unit = base_cfg.get(FOOD_WEIGHT_BUCKETS[food_rank][1], per_unit)
 
   unit_overrides = WEIGHT_CONFIG.get("unit_overrides", {})
   if unit_norm in unit_overrides:
@@ -485,34 +718,18 @@ def estimate_weight(qty: Optional[float], unit: Optional[str], name: str) -> Opt
       per_unit = max(per_unit, unit_overrides[unit_norm])
   else:
     # fallback heuristics if not explicitly in config
-    if "bag" in unit_norm:
-      per_unit = max(per_unit, 8)
-    elif "bin" in unit_norm or "tote" in unit_norm or "crate" in unit_norm:
-      per_unit = max(per_unit, 25)
-    elif "box" in unit_norm or "case" in unit_norm or "cs" in unit_norm or "pkg" in unit_norm or "package" in unit_norm:
-      per_unit = max(per_unit, 15)
-    elif "flat" in unit_norm:
-      per_unit = max(per_unit, 12)
-    elif "gallon" in unit_norm or "gal" in unit_norm:
-      per_unit = max(per_unit, 8)
-    elif unit_norm in {"lb", "pound", "pounds"}:
-      per_unit = 1
-    elif "dozen" in unit_norm or unit_norm == "dz":
-      per_unit = max(per_unit, 4)
-    elif "loaf" in unit_norm:
-      per_unit = max(per_unit, 0.5)
-    elif "bottle" in unit_norm or "can" in unit_norm or "jar" in unit_norm:
-      per_unit = max(per_unit, 2)
-    elif "tray" in unit_norm or "clamshell" in unit_norm:
-      per_unit = max(per_unit, 3)
-    elif "bunch" in unit_norm:
-      per_unit = max(per_unit, 5)
-    elif "each" in unit_norm:
-      per_unit = max(per_unit, 2)
+    floor = unit_fallback_floor(unit_norm)
+    if floor is not None:
+      per_unit = max(per_unit, floor)
     elif "bread" in name_norm or "dessert" in name_norm:
       per_unit = max(per_unit, 2.5)
+  return per_unit
 
-  estimate = round(per_unit * qty, 2)
+
+def estimate_weight(qty: Optional[float], unit: Optional[str], name: str) -> Optional[float]:
+  if qty is None or qty <= 0:
+    return None
+  estimate = round(per_unit_weight((unit or "").lower(), name.lower()) * qty, 2)
   return estimate if estimate >= 0 else None
 
 
@@ -522,14 +739,12 @@ def parse_items(text: str) -> List[ParsedItem]:
   for segment in split_item_segments(normalized):
     if not segment:
       continue
-    lower = segment.lower()
-    if lower.startswith(("http", "<http", "https")) or "google.com/maps" in lower:
-      continue
-    if "<@" in segment:
+    # Links, map pins and @-mentions are never item lines.
+    if SEGMENT_SKIP_RE.search(segment.lower()):
       continue
 
     # Drop leading words before the first digit or tilde (e.g., "grabbed 2 boxes...")
-    segment = re.sub(r"^[^0-9~]*", "", segment)
+    segment = LEADING_NON_DIGIT_RE.sub("", segment)
     segment = segment.strip()
     if not segment:
       continue
@@ -542,16 +757,19 @@ def parse_items(text: str) -> List[ParsedItem]:
       qty = float(qty_raw)
     except Exception:
       qty = None
+    if qty is not None and qty > 500:
+      continue
     unit_raw = match.group("unit") or ""
-    unit_norm = ITEM_UNIT_MAP.get(unit_raw.lower().strip(), unit_raw.lower().strip() or None)
+    unit_key = unit_raw.lower().strip()
+    unit_norm = ITEM_UNIT_MAP.get(unit_key, unit_key or None)
     name = match.group("name").strip(" .;-").strip()
     if not name:
       continue
-    name = re.sub(r"\(([^)]{1,80})\)\s*$", "", name).strip()
-    name = re.sub(r"\b(?:in|on|inside)\s+(?:the\s+)?(?:cooler|freezer|fridge|fridges?)\b", "", name, flags=re.IGNORECASE).strip()
+    name = PAREN_TAIL_RE.sub("", name).strip()
+    name = STORAGE_SUFFIX_RE.sub("", name).strip()
 
     if not unit_norm:
-      trailing_unit = re.match(r"^(?P<item>.+?)\s+(?P<unit>boxes?|box|cases?|case|crates?|totes?|bins?|bags?)$", name, flags=re.IGNORECASE)
+      trailing_unit = TRAILING_UNIT_RE.match(name)
       if trailing_unit:
         unit_guess = trailing_unit.group("unit").lower()
         unit_norm = ITEM_UNIT_MAP.get(unit_guess, unit_guess)
@@ -559,37 +777,36 @@ def parse_items(text: str) -> List[ParsedItem]:
 
     lower_name = name.lower()
     if not unit_norm:
-      bag_match = re.match(r"^(?:big|large|lrg)?\s*bags?\b\s+(.*)$", name, flags=re.IGNORECASE)
+      bag_match = LEADING_BAG_RE.match(name)
       if bag_match:
         unit_norm = "bag"
         name = bag_match.group(1).strip()
-    if unit_norm in {"bag", "bags"} and (lower_name.startswith("big") or lower_name.startswith("large") or lower_name.startswith("lrg")):
-      name = re.sub(r"^(?:big|large|lrg)\s+", "", name, flags=re.IGNORECASE).strip()
-    if name.lower().startswith("big bags"):
-      name = re.sub(r"\bbig\s+bags?\s+", "", name, flags=re.IGNORECASE).strip()
-    name = re.sub(r"\bbags?\b", "", name, flags=re.IGNORECASE).strip()
-    name = re.sub(r"^(?:big|large|small|lrg)\s+(split\s+peas?)", r"\1", name, flags=re.IGNORECASE)
-    name = re.sub(r"\s{2,}", " ", name).strip()
+    if unit_norm in {"bag", "bags"} and lower_name.startswith(("big", "large", "lrg")):
+      name = LEADING_SIZE_RE.sub("", name).strip()
+    # The bag and split-pea cleanups only apply to names that mention them.
+    if "bag" in name.lower():
+      if name.lower().startswith("big bags"):
+        name = BIG_BAGS_RE.sub("", name).strip()
+      name = BAG_WORD_RE.sub("", name).strip()
+    if "split" in name.lower():
+      name = SIZED_SPLIT_PEAS_RE.sub(r"\1", name)
+    name = MULTI_SPACE_RE.sub(" ", name).strip()
     name = name.lower().strip()
-    typo_map = {
-      "brocolli": "broccoli",
-      "brussel sprouts": "brussels sprouts",
-    }
-    name = typo_map.get(name, name)
-    alpha_len = len(re.sub(r"[^a-z]", "", name.lower()))
+    name = TYPO_MAP.get(name, name)
+    # name is lowercase from here on.
+    # A segment ending in "shopping bags" is a unit with no item; the unit-less
+    # fallback leaves just the "shopping" half of it after the bag cleanup.
+    if name == "shopping":
+      continue
+    alpha_len = len(name) - len(name.translate(DROP_ASCII_LOWER_TABLE))
     if alpha_len < 3:
       continue
-    if "<@" in name or "http" in name.lower():
-      continue
-    if qty is not None and qty > 500:
+    if NAME_SKIP_RE.search(name):
       continue
     if qty is not None and qty > 150 and not unit_norm:
       continue
     subcategory = categorize_item(name)
-    name_lower = name.lower()
-    if any(token in name_lower for token in ["google", "docs.google", "guide", "meeting", "channel", "thermometer", "dumpster", "door", "code", "recycling", "compost", "cardboard", "loading", "schedule"]):
-      continue
-    if not unit_norm and re.search(r"\b(am|pm)\b", name_lower):
+    if not unit_norm and AM_PM_RE.search(name):
       continue
     if "!" in name:
       continue
@@ -602,44 +819,84 @@ def parse_items(text: str) -> List[ParsedItem]:
   return items
 
 
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def epoch_micros(dt: Optional[datetime]) -> Optional[int]:
+  # Naive timestamps are read as UTC so every row sorts on one timeline.
+  if dt is None:
+    return None
+  if dt.tzinfo is None:
+    dt = dt.replace(tzinfo=timezone.utc)
+  return (dt - EPOCH) // ONE_MICROSECOND
+
+
 def group_messages(rows: List[MessageRow], window_minutes: int) -> List[Dict]:
-  usable = [r for r in rows if r.msg_type == "message" and r.subtype != "channel_join" and r.text.strip()]
-  usable.sort(key=lambda r: (r.dt or datetime.min.replace(tzinfo=timezone.utc)))
+  # Column-wise copies of the usable rows; the sort and the grouping scan only
+  # touch the integer time keys and users.
+  users: List[str] = []
+  texts: List[str] = []
+  tss: List[str] = []
+  dts: List[Optional[datetime]] = []
+  keys: List[Optional[int]] = []
+  for r in rows:
+    if r.msg_type == "message" and r.subtype != "channel_join" and r.text.strip():
+      users.append(r.user)
+      texts.append(r.text)
+      tss.append(r.ts)
+      dts.append(r.dt)
+      keys.append(epoch_micros(r.dt))
+
+  missing_key = epoch_micros(datetime.min.replace(tzinfo=timezone.utc))
+  sort_keys = [missing_key if key is None else key for key in keys]
+  order = sorted(range(len(sort_keys)), key=sort_keys.__getitem__)
 
   groups: List[Dict] = []
   current: Optional[Dict] = None
-  delta = timedelta(minutes=window_minutes)
-
-  for row in usable:
-    if current and row.user == current["user"] and row.dt and current["last_dt"] and row.dt - current["last_dt"] <= delta:
-      current["messages"].append(row.text)
-      current["timestamps"].append(row.ts)
-      current["last_dt"] = row.dt
+  last_key: Optional[int] = None
+  window = timedelta(minutes=window_minutes) // ONE_MICROSECOND
+
+  for i in order:
+    key = keys[i]
+    if current and users[i] == current["user"] and key is not None and last_key is not None and key - last_key <= window:
+      current["messages"].append(texts[i])
+      current["timestamps"].append(tss[i])
+      current["last_dt"] = dts[i]
     else:
       if current:
         groups.append(current)
       current = {
-        "user": row.user,
-        "start_ts": row.ts,
-        "end_ts": row.ts,
-        "start_dt": row.dt,
-        "last_dt": row.dt,
-        "messages": [row.text],
-        "timestamps": [row.ts],
+        "user": users[i],
+        "start_ts": tss[i],
+        "end_ts": tss[i],
+        "start_dt": dts[i],
+        "last_dt": dts[i],
+        "messages": [texts[i]],
+        "timestamps": [tss[i]],
       }
+    last_key = key
   if current:
     groups.append(current)
   return groups
 
 
 def summarize(records: List[Dict]) -> None:
-  direction_counter = Counter(r["direction"] for r in records)
-  item_hits = sum(1 for r in records if r["items"])
-  rescue_counter = Counter(r["rescue_location"] for r in records if r["rescue_location"])
-  drop_counter = Counter(r["drop_off_location"] for r in records if r["drop_off_location"])
-  item_counter = Counter()
+  direction_counter: Counter = Counter()
+  rescue_counter: Counter = Counter()
+  drop_counter: Counter = Counter()
+  item_counter: Counter = Counter()
+  item_hits = 0
   for r in records:
-    for item in r["items"]:
+    direction_counter[r["direction"]] += 1
+    if r["rescue_location"]:
+      rescue_counter[r["rescue_location"]] += 1
+    if r["drop_off_location"]:
+      drop_counter[r["drop_off_location"]] += 1
+    items = r["items"]
+    if items:
+      item_hits += 1
+    for item in items:
       item_counter[item["name"].lower()] += item.get("quantity") or 1
 
   print("\nSummary:")
@@ -685,43 +942,36 @@ def main() -> None:
   rows = read_xlsx_messages(args.input)
   groups = group_messages(rows, window_minutes=args.group_minutes)
 
+  # Records are written as they are built; summarize() only needs the
+  # direction, location and item fields kept in `records`.
   records: List[Dict] = []
-  for idx, group in enumerate(groups):
-    combined_text = "\n".join(group["messages"])
-    rescue_loc = extract_rescue_location(combined_text)
-    drop_loc = extract_dropoff_location(combined_text)
-    direction = detect_direction(combined_text, rescue_loc=rescue_loc, drop_loc=drop_loc)
-    sections = parse_sections(combined_text)
-    if sections:
-      flat_items = []
-      for sec in sections:
-        flat_items.extend(sec.get("items", []))
-      items = flat_items
-      if not rescue_loc and sections[0].get("location"):
-        rescue_loc = sections[0]["location"]
-      if drop_loc:
-        existing = {sec.get("location") for sec in sections}
-        if drop_loc not in existing:
-          sections.append({"location": drop_loc, "items": flat_items})
-    else:
-      items = [
-        {
-          "name": item.name,
-          "quantity": item.quantity,
-          "unit": item.unit,
-          "estimated_lbs": item.estimated_lbs,
-          "subcategory": item.subcategory,
-        }
-        for item in parse_items(combined_text)
-      ]
-      if rescue_loc or drop_loc:
-        sections = [{
-          "location": rescue_loc or drop_loc or "",
-          "items": items,
-        }]
-
-    records.append(
-      {
+  with open(args.output, "wb", buffering=1 << 20) as out:
+    for idx, group in enumerate(groups):
+      combined_text = "\n".join(group["messages"])
+      rescue_loc = extract_rescue_location(combined_text)
+      drop_loc = extract_dropoff_location(combined_text)
+      direction = detect_direction(combined_text, rescue_loc=rescue_loc, drop_loc=drop_loc)
+      sections = parse_sections(combined_text)
+      if sections:
+        flat_items = []
+        for sec in sections:
+          flat_items.extend(sec.get("items", []))
+        items = flat_items
+        if not rescue_loc and sections[0].get("location"):
+          rescue_loc = sections[0]["location"]
+        if drop_loc:
+          existing = {sec.get("location") for sec in sections}
+          if drop_loc not in existing:
+            sections.append({"location": drop_loc, "items": flat_items})
+      else:
+        items = [item.as_dict() for item in parse_items(combined_text)]
+        if rescue_loc or drop_loc:
+          sections = [{
+            "location": rescue_loc or drop_loc or "",
+            "items": items,
+          }]
+
+      rec = {
         "id": idx + 1,
         "user": group["user"],
         "start_ts": group["start_ts"],
@@ -732,12 +982,14 @@ def main() -> None:
         "items": items,
         "sections": sections,
         "raw_messages": group["messages"],
-      },
-    )
-
-  with open(args.output, "w", encoding="utf-8") as f:
-    for rec in records:
-      f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+      }
+      out.write(orjson.dumps(rec, option=orjson.OPT_APPEND_NEWLINE))
+      records.append({
+        "direction": direction,
+        "rescue_location": rescue_loc,
+        "drop_off_location": drop_loc,
+        "items": items,
+      })
 
   print(f"Wrote {len(records)} rows to {args.output}")
   summarize(records)
@@ -9,37 +9,118 @@ Usage:
 """
 
 import argparse
+import copy
 import json
+import os
 import sys
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, Iterator, List, Any, Optional
 
 try:
+    import orjson
     import torch
     from peft import PeftModel
-    from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
+    from transformers import (
+        AutoModelForCausalLM,
+        AutoTokenizer,
+        BitsAndBytesConfig,
+        DynamicCache,
+        StoppingCriteria,
+        StoppingCriteriaList,
+    )
 except ImportError as e:
+    # Imported as a module (e.g. by slack_api), let the caller handle it
+    if __name__ != "__main__":
+        raise
     print(f"Error: Missing required package: {e}")
     print("Please install requirements: pip install -r requirements.txt")
     sys.exit(1)
 
 from manage_models import ModelRegistry
 
+# Instruction text shared by every prompt, up to where the message is inserted
+PROMPT_PREFIX = (
+    "You are a Slack warehouse log extractor. Return JSON only with fields:\n"
+    "- direction (string|null) [inbound, outbound, both, unknown]\n"
+    "- rescue_location (string|null)\n"
+    "- drop_off_location (string|null)\n"
+    "- sections (array of { location, items })\n"
+    "- items (array of rows with name, quantity, unit, estimated_lbs, subcategory)\n\n"
+    "Message:\n"
+)
+
+# Predictions written between flushes of the output file to disk
+FSYNC_EVERY = 100
+
+
+class JsonBraceStop(StoppingCriteria):
+    """Stop each row once the first JSON object it generates is closed.
+
+    Only the newest token of each row is decoded per step; brace depth and
+    string/escape state carry over between steps so braces inside string
+    values are ignored.
+    """
+
+    def __init__(self, tokenizer, batch_size: int):
+        self.tokenizer = tokenizer
+        self.depth = [0] * batch_size
+        self.in_string = [False] * batch_size
+        self.escaped = [False] * batch_size
+        self.done = [False] * batch_size
+
+    def __call__(self, input_ids, scores, **kwargs):
+        for row, token_id in enumerate(input_ids[:, -1].tolist()):
+            if self.done[row]:
+                continue
+            for char in self.tokenizer.decode([token_id]):
+                if self.in_string[row]:
+                    if self.escaped[row]:
+                        self.escaped[row] = False
+                    elif char == "\\":
+                        self.escaped[row] = True
+                    elif char == '"':
+                        self.in_string[row] = False
+                elif char == '"':
+                    self.in_string[row] = self.depth[row] > 0
+                elif char == "{":
+                    self.depth[row] += 1
+                elif char == "}" and self.depth[row] > 0:
+                    self.depth[row] -= 1
+                    if self.depth[row] == 0:
+                        self.done[row] = True
+                        break
+        return torch.tensor(self.done, dtype=torch.bool, device=input_ids.device)
+
 
 class SlackMessageInferencer:
     """PEFT model inference engine for Slack warehouse messages."""
 
-    def __init__(self, adapter_path: Path, use_quantization: bool = True, device: Optional[str] = None):
+    def __init__(
+        self,
+        adapter_path: Path,
+        use_quantization: bool = True,
+        device: Optional[str] = None,
+        compile_model: bool = False,
+        keep_adapter: bool = False,
+        kv_cache: str = "dynamic",
+    ):
         self.adapter_path = adapter_path
         self.use_quantization = use_quantization
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.compile_model = compile_model
+        self.keep_adapter = keep_adapter
+        self.kv_cache = kv_cache
+        self.compiled = False
+        self.warmed_up = False
         self.base_model_id = "meta-llama/Llama-3.2-1B-Instruct"
 
         self.model = None
         self.tokenizer = None
+        self.prefix_ids = None
+        self.prefix_cache = None
 
         print(f"Initializing inferencer with adapter: {adapter_path}")
-        print(f"Device: {self.device}, Quantization: {use_quantization}")
+        print(f"Device: {self.device}, Quantization: {use_quantization and self.device == 'cuda'}")
 
     def load_model(self) -> None:
         """Load base model + LoRA adapter with optional quantization."""
@@ -49,14 +130,16 @@ class SlackMessageInferencer:
 
         print(f"Loading base model: {self.base_model_id}...")
 
-        # Load tokenizer
-        self.tokenizer = AutoTokenizer.from_pretrained(self.base_model_id)
+        # Load tokenizer (always the Rust-backed fast tokenizer). Batched
+        # generation for a causal LM needs padding on the left.
+        self.tokenizer = AutoTokenizer.from_pretrained(self.base_model_id, use_fast=True, padding_side="left")
         if self.tokenizer.pad_token is None:
             self.tokenizer.pad_token = self.tokenizer.eos_token
 
-        # Quantization config for CPU inference
+        # 4-bit NF4 only pays off on GPU; bitsandbytes' CPU kernels are slower
+        # than plain bf16, so CPU runs always load the bf16 weights.
         quantization_config = None
-        if self.use_quantization and self.device == "cpu":
+        if self.use_quantization and self.device == "cuda":
             try:
                 quantization_config = BitsAndBytesConfig(
                     load_in_4bit=True,
@@ -82,55 +165,112 @@ class SlackMessageInferencer:
         print(f"Loading adapter from: {self.adapter_path}...")
         self.model = PeftModel.from_pretrained(self.model, str(self.adapter_path))
 
+        # Fold the LoRA deltas into the base weights so each layer runs one
+        # matmul instead of base + adapter. Merging into 4-bit weights would
+        # re-quantize them, so quantized models keep the adapter separate.
+        if not self.keep_adapter and quantization_config is None:
+            print("Merging adapter into base weights...")
+            self.model = self.model.merge_and_unload()
+
+        if self.compile_model:
+            # generate() calls the underlying model's forward directly, so compile
+            # that method rather than wrapping the PeftModel object. CUDA graphs
+            # (reduce-overhead) are GPU only; CPU uses the default Inductor mode.
+            print("Compiling model forward (first generate call warms up)...")
+            mode = "reduce-overhead" if self.device == "cuda" else "default"
+            base_model = self.model.get_base_model() if isinstance(self.model, PeftModel) else self.model
+            base_model.forward = torch.compile(base_model.forward, mode=mode, fullgraph=False)
+            self.compiled = True
+
+        # Run the shared instruction prefix through the model once; single
+        # message calls start from a copy of its KV cache and only prefill the
+        # message itself. Static and quantized caches are built by generate()
+        # itself, so they skip the shared prefix.
+        if self.kv_cache == "dynamic":
+            self.prefix_ids = self.tokenizer(PROMPT_PREFIX, return_tensors="pt").input_ids.to(self.model.device)
+            self.prefix_cache = DynamicCache()
+            with torch.no_grad():
+                self.model(self.prefix_ids, past_key_values=self.prefix_cache, use_cache=True)
+
         print("✓ Model and adapter loaded successfully")
 
+    def to_device(self, tensors: Dict[str, Any]) -> Dict[str, Any]:
+        """Move tokenizer output to the model device.
+
+        On CUDA the tensors go through pinned memory with non_blocking copies,
+        so the host-to-device transfer overlaps with kernel launches.
+        """
+        if self.device == "cuda":
+            return {key: value.pin_memory().to(self.model.device, non_blocking=True) for key, value in tensors.items()}
+        return {key: value.to(self.model.device) for key, value in tensors.items()}
+
     def build_prompt(self, message_text: str) -> str:
         """Build prompt for extraction task."""
-        return (
-            "You are a Slack warehouse log extractor. Return JSON only with fields:\n"
-            "- direction (string|null) [inbound, outbound, both, unknown]\n"
-            "- rescue_location (string|null)\n"
-            "- drop_off_location (string|null)\n"
-            "- sections (array of { location, items })\n"
-            "- items (array of rows with name, quantity, unit, estimated_lbs, subcategory)\n\n"
-            f"Message:\n{message_text}\n\n"
-            "JSON:"
-        )
+        return f"{PROMPT_PREFIX}{message_text}\n\nJSON:"
 
     def infer_single(self, message_text: str, max_tokens: int = 512) -> Dict[str, Any]:
         """Run inference on a single message."""
+        return self.infer_messages([message_text], max_tokens=max_tokens)[0]
+
+    def infer_messages(self, messages: List[str], max_tokens: int = 512) -> List[Dict[str, Any]]:
+        """Run one batched generate() call over several messages."""
         if self.model is None:
             self.load_model()
 
-        prompt = self.build_prompt(message_text)
-
-        inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
+        prompts = [self.build_prompt(message) for message in messages]
+
+        cache_kwargs = {}
+        if len(messages) == 1 and self.prefix_cache is not None:
+            suffix_ids = self.to_device(self.tokenizer(
+                prompts[0][len(PROMPT_PREFIX):],
+                add_special_tokens=False,
+                return_tensors="pt",
+            ))["input_ids"]
+            input_ids = torch.cat([self.prefix_ids, suffix_ids], dim=1)
+            inputs = {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+            # generate() extends the cache in place, so each call gets its own copy
+            cache_kwargs["past_key_values"] = copy.deepcopy(self.prefix_cache)
+        else:
+            # Left padding (set in load_model) keeps every prompt flush against
+            # its generated tokens. Padded rows cannot share the prefix cache.
+            inputs = self.to_device(self.tokenizer(prompts, return_tensors="pt", padding=True))
+            if self.kv_cache == "static":
+                # Fixed-shape cache; lets a compiled forward reuse its graphs
+                cache_kwargs["cache_implementation"] = "static"
+            elif self.kv_cache == "quantized":
+                # 4-bit KV cache: less cache memory traffic per decoded token
+                cache_kwargs["cache_implementation"] = "quantized"
+                cache_kwargs["cache_config"] = {"backend": "quanto", "nbits": 4}
 
         with torch.no_grad():
+            # Greedy decoding: extraction wants the most likely JSON, and
+            # skipping sampling avoids per-token softmax/RNG work.
             outputs = self.model.generate(
                 **inputs,
                 max_new_tokens=max_tokens,
-                temperature=0.1,
-                do_sample=True,
+                do_sample=False,
+                num_beams=1,
+                use_cache=True,
                 pad_token_id=self.tokenizer.pad_token_id,
                 eos_token_id=self.tokenizer.eos_token_id,
+                # Stop once the JSON object closes; max_tokens is only a ceiling
+                stopping_criteria=StoppingCriteriaList([JsonBraceStop(self.tokenizer, len(messages))]),
+                **cache_kwargs,
             )
 
-        # Decode output
-        full_output = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-
-        # Extract JSON (everything after "JSON:")
-        if "JSON:" in full_output:
-            json_str = full_output.split("JSON:")[-1].strip()
-        else:
-            json_str = full_output[len(prompt):].strip()
+        # Every row carries the (left-padded) prompt ahead of its generated
+        # tokens; decode only the new tokens instead of re-decoding the prompt.
+        prompt_len = inputs["input_ids"].shape[1]
+        generated = self.tokenizer.batch_decode(outputs[:, prompt_len:], skip_special_tokens=True)
+        return [self.parse_output(json_str.strip()) for json_str in generated]
 
-        # Parse JSON
+    def parse_output(self, json_str: str) -> Dict[str, Any]:
+        """Parse the model's JSON, or return an empty prediction flagged invalid."""
         try:
-            result = json.loads(json_str)
+            result = orjson.loads(json_str)
             result["_raw_output"] = json_str
             result["_valid_json"] = True
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             result = {
                 "_raw_output": json_str,
                 "_valid_json": False,
@@ -145,36 +285,89 @@ class SlackMessageInferencer:
 
     def infer_batch(self, messages: List[str], batch_size: int = 4) -> List[Dict[str, Any]]:
         """Run inference on multiple messages with batching."""
+        return list(self.iter_batch(messages, batch_size=batch_size))
+
+    def iter_batch(self, messages: List[str], batch_size: int = 4) -> Iterator[Dict[str, Any]]:
+        """Like infer_batch, but yield each result (in input order) once it is ready."""
         if self.model is None:
             self.load_model()
 
-        results = []
-        for i in range(0, len(messages), batch_size):
-            batch = messages[i:i + batch_size]
-            print(f"Processing batch {i // batch_size + 1} ({len(batch)} messages)...")
-
-            for message in batch:
-                result = self.infer_single(message)
-                results.append(result)
-
-        return results
+        if self.compiled and not self.warmed_up and messages:
+            # Pay the compile warm-up once before the timed batches
+            print("Warming up compiled model...")
+            self.infer_single("Picked up 1 case bananas from Aldi", max_tokens=8)
+            self.warmed_up = True
+
+        # Batch prompts of similar token length together so short prompts are
+        # not padded out to a long neighbour; a batch closes once it is full or
+        # the next prompt is over twice its shortest.
+        prompts = [self.build_prompt(message) for message in messages]
+        lengths = [len(ids) for ids in self.tokenizer(prompts)["input_ids"]]
+        batches: List[List[int]] = []
+        for idx in sorted(range(len(messages)), key=lengths.__getitem__):
+            if batches and len(batches[-1]) < batch_size and lengths[idx] <= 2 * lengths[batches[-1][0]]:
+                batches[-1].append(idx)
+            else:
+                batches.append([idx])
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(messages)
+        next_idx = 0
+        for number, batch in enumerate(batches, 1):
+            print(f"Processing batch {number} ({len(batch)} messages)...")
+
+            batch_results = self.infer_messages([messages[idx] for idx in batch])
+            for idx, result in zip(batch, batch_results):
+                results[idx] = result
+
+            # Hand back every result whose predecessors are all done
+            while next_idx < len(messages) and results[next_idx] is not None:
+                yield results[next_idx]
+                results[next_idx] = None
+                next_idx += 1
+
+    def infer_stream(
+        self,
+        messages: Iterable[str],
+        batch_size: int = 4,
+        window_batches: int = 8,
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield results in input order, holding only a window of messages at a time.
+
+        Each window of batch_size * window_batches messages goes through
+        iter_batch, so length bucketing still applies within the window.
+        """
+        window: List[str] = []
+        for message in messages:
+            window.append(message)
+            if len(window) >= batch_size * window_batches:
+                yield from self.iter_batch(window, batch_size=batch_size)
+                window = []
+        if window:
+            yield from self.iter_batch(window, batch_size=batch_size)
 
     def compare_with_regex(self, model_result: Dict, regex_result: Dict) -> Dict[str, Any]:
         """Compare model output with regex extraction."""
+        model_rows = model_result.get("items") or ()
+        regex_rows = regex_result.get("items") or ()
         comparison = {
             "direction_match": model_result.get("direction") == regex_result.get("direction"),
             "rescue_location_match": model_result.get("rescue_location") == regex_result.get("rescue_location"),
             "drop_off_location_match": model_result.get("drop_off_location") == regex_result.get("drop_off_location"),
-            "item_count_diff": len(model_result.get("items", [])) - len(regex_result.get("items", [])),
+            "item_count_diff": len(model_rows) - len(regex_rows),
         }
 
-        # Compare item names
-        model_items = {item.get("name", "").lower() for item in model_result.get("items", [])}
-        regex_items = {item.get("name", "").lower() for item in regex_result.get("items", [])}
+        # Compare item names (rows without a name have nothing to match on)
+        model_items = {name.lower() for name in (item.get("name") for item in model_rows) if name}
+        regex_items = {name.lower() for name in (item.get("name") for item in regex_rows) if name}
 
-        comparison["items_only_in_model"] = list(model_items - regex_items)
-        comparison["items_only_in_regex"] = list(regex_items - model_items)
-        comparison["items_in_both"] = list(model_items & regex_items)
+        if model_items and regex_items:
+            comparison["items_only_in_model"] = list(model_items - regex_items)
+            comparison["items_only_in_regex"] = list(regex_items - model_items)
+            comparison["items_in_both"] = list(model_items & regex_items)
+        else:
+            comparison["items_only_in_model"] = list(model_items)
+            comparison["items_only_in_regex"] = list(regex_items)
+            comparison["items_in_both"] = []
 
         # Overall match score
         matches = sum([
@@ -188,6 +381,25 @@ class SlackMessageInferencer:
         return comparison
 
 
+def iter_messages(input_path: Path) -> Iterator[str]:
+    """Yield message text from each JSONL record ('input_text' or 'raw_messages')."""
+    with open(input_path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = orjson.loads(line)
+            if "input_text" in record:
+                yield record["input_text"]
+            elif "raw_messages" in record:
+                raw = record["raw_messages"]
+                if isinstance(raw, list):
+                    yield "\n".join(raw)
+                else:
+                    yield str(raw)
+            else:
+                print(f"Warning: Record missing input_text or raw_messages: {record.get('id')}", file=sys.stderr)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Run PEFT inference on Slack messages")
     parser.add_argument(
@@ -210,7 +422,24 @@ def main():
     parser.add_argument(
         "--no-quantization",
         action="store_true",
-        help="Disable 4-bit quantization (uses more memory)",
+        help="Disable 4-bit quantization on CUDA (uses more memory; CPU always runs bf16)",
+    )
+    parser.add_argument(
+        "--keep-adapter",
+        action="store_true",
+        help="Keep the LoRA adapter separate instead of merging it into the base weights",
+    )
+    parser.add_argument(
+        "--compile",
+        action="store_true",
+        help="torch.compile the model forward (slow first call, faster decoding after)",
+    )
+    parser.add_argument(
+        "--kv-cache",
+        choices=["dynamic", "static", "quantized"],
+        default="dynamic",
+        help="KV cache type: dynamic (default, reuses the prompt prefix), "
+             "static (pairs with --compile) or quantized (4-bit, needs optimum-quanto)",
     )
     parser.add_argument(
         "--batch-size",
@@ -238,6 +467,9 @@ def main():
     inferencer = SlackMessageInferencer(
         adapter_path=adapter_path,
         use_quantization=not args.no_quantization,
+        compile_model=args.compile,
+        keep_adapter=args.keep_adapter,
+        kv_cache=args.kv_cache,
     )
 
     # Process single message
@@ -256,36 +488,24 @@ def main():
             print(f"Error: Input file not found: {input_path}", file=sys.stderr)
             return 1
 
-        # Load messages
-        messages = []
-        with open(input_path) as f:
-            for line in f:
-                if not line.strip():
-                    continue
-                record = json.loads(line)
-                if "input_text" in record:
-                    messages.append(record["input_text"])
-                elif "raw_messages" in record:
-                    raw = record["raw_messages"]
-                    if isinstance(raw, list):
-                        messages.append("\n".join(raw))
-                    else:
-                        messages.append(str(raw))
-                else:
-                    print(f"Warning: Record missing input_text or raw_messages: {record.get('id')}", file=sys.stderr)
-
-        print(f"Processing {len(messages)} messages from {input_path}...")
+        print(f"Processing messages from {input_path}...")
 
-        # Run inference
-        results = inferencer.infer_batch(messages, batch_size=args.batch_size)
+        # Messages are read, inferred and written a window at a time
+        results = inferencer.infer_stream(iter_messages(input_path), batch_size=args.batch_size)
 
         # Save results
         if args.output:
             output_path = Path(args.output)
-            with open(output_path, "w") as f:
+            count = 0
+            with open(output_path, "wb", buffering=65536) as f:
                 for result in results:
-                    f.write(json.dumps(result, ensure_ascii=False) + "\n")
-            print(f"\n✓ Predictions saved to: {output_path}")
+                    f.write(orjson.dumps(result, option=orjson.OPT_APPEND_NEWLINE))
+                    count += 1
+                    # Keep a crash from losing everything written so far
+                    if count % FSYNC_EVERY == 0:
+                        f.flush()
+                        os.fsync(f.fileno())
+            print(f"\n✓ {count} predictions saved to: {output_path}")
         else:
             for idx, result in enumerate(results, 1):
                 print(f"\n=== Message {idx} ===")
@@ -13,15 +13,21 @@ Environment variables:
 
 import argparse
 import json
+import logging
 import os
+import shlex
 import subprocess
 import sys
+import tempfile
+import threading
 import time
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 class LambdaLabsTrainer:
@@ -39,10 +45,25 @@ class LambdaLabsTrainer:
                 "Get your API key from https://cloud.lambdalabs.com/api-keys"
             )
 
+        # Reuse one keep-alive connection for the status polling instead of a
+        # new TLS handshake per request. Retries (with exponential backoff)
+        # cover connection errors and transient 429/5xx responses.
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {self.api_key}"})
+        retry = Retry(
+            total=3,
+            backoff_factor=1,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=None,
+        )
+        self.session.mount("https://", HTTPAdapter(max_retries=retry, pool_connections=2, pool_maxsize=4))
+
         self.ssh_key = os.getenv("SSH_PRIVATE_KEY", str(Path.home() / ".ssh" / "id_rsa"))
         self.instance_id: Optional[str] = None
         self.instance_ip: Optional[str] = None
         self.ssh_user = "ubuntu"
+        # Shared master connection so each ssh/rsync step skips the handshake
+        self.ssh_control_path = str(Path(tempfile.gettempdir()) / "lambda-train-ssh-%C")
 
         # Paths
         self.project_root = Path(__file__).resolve().parent.parent.parent
@@ -51,6 +72,16 @@ class LambdaLabsTrainer:
         self.log_dir = self.training_dir / "logs" / version
         self.log_dir.mkdir(parents=True, exist_ok=True)
 
+        # One logger per run; the log file stays open instead of being
+        # reopened for every line written by the polling loops.
+        self.logger = logging.getLogger(f"lambda_train.{version}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        formatter = logging.Formatter("[%(asctime)s] [%(levelname)s] %(message)s", "%Y-%m-%d %H:%M:%S")
+        for handler in (logging.StreamHandler(sys.stdout), logging.FileHandler(self.log_dir / "training.log")):
+            handler.setFormatter(formatter)
+            self.logger.addHandler(handler)
+
         # Metadata
         self.metadata: Dict[str, Any] = {
             "version": version,
@@ -60,33 +91,47 @@ class LambdaLabsTrainer:
 
     def log(self, message: str, level: str = "INFO") -> None:
         """Log message to console and file."""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_msg = f"[{timestamp}] [{level}] {message}"
-        print(log_msg)
+        self.logger.log(logging.getLevelName(level), message)
+
+    def close_log(self) -> None:
+        """Close the log handlers opened in __init__."""
+        for handler in list(self.logger.handlers):
+            handler.close()
+            self.logger.removeHandler(handler)
+
+    def ssh_options(self) -> List[str]:
+        """Common ssh options; all calls multiplex over one master connection."""
+        return [
+            "-i", self.ssh_key,
+            "-o", "StrictHostKeyChecking=no",
+            "-o", "ControlMaster=auto",
+            "-o", f"ControlPath={self.ssh_control_path}",
+            "-o", "ControlPersist=300",
+        ]
 
-        log_file = self.log_dir / "training.log"
-        with open(log_file, "a") as f:
-            f.write(log_msg + "\n")
+    def close_ssh(self) -> None:
+        """Shut down the shared ssh master connection, if one is running."""
+        if not self.instance_ip:
+            return
+        subprocess.run(
+            ["ssh", *self.ssh_options(), "-O", "exit", f"{self.ssh_user}@{self.instance_ip}"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
 
     def api_request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
-        """Make authenticated API request with retry logic."""
+        """Make authenticated API request (retries are handled by the session)."""
         url = f"{self.base_url}/{endpoint.lstrip('/')}"
-        headers = {"Authorization": f"Bearer {self.api_key}"}
 
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = requests.request(method, url, headers=headers, **kwargs)
-                response.raise_for_status()
-                return response
-            except requests.exceptions.RequestException as e:
-                self.log(f"API request failed (attempt {attempt + 1}/{max_retries}): {e}", "WARNING")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)  # Exponential backoff
-                else:
-                    raise
-
-    def list_instance_types(self) -> List[Dict]:
+        try:
+            response = self.session.request(method, url, **kwargs)
+            response.raise_for_status()
+            return response
+        except requests.exceptions.RequestException as e:
+            self.log(f"API request failed: {e}", "WARNING")
+            raise
+
+    def list_instance_types(self) -> Dict[str, Dict]:
         """Get available GPU instance types."""
         self.log("Fetching available instance types...")
         response = self.api_request("GET", "/instance-types")
@@ -118,16 +163,15 @@ class LambdaLabsTrainer:
         selected_region = None
 
         for instance_type_name in preferred_types:
-            for instance_type, details in instance_types_data.items():
-                if instance_type == instance_type_name:
-                    regions = details.get("regions_with_capacity_available", [])
-                    if regions:
-                        selected_type = instance_type
-                        selected_region = regions[0]["name"]
-                        price = details.get("instance_type", {}).get("price_cents_per_hour", 0) / 100
-                        self.log(f"Found available instance: {selected_type} in {selected_region} (${price:.2f}/hr)")
-                        break
-            if selected_type:
+            details = instance_types_data.get(instance_type_name)
+            if not details:
+                continue
+            regions = details.get("regions_with_capacity_available", [])
+            if regions:
+                selected_type = instance_type_name
+                selected_region = regions[0]["name"]
+                price = details.get("instance_type", {}).get("price_cents_per_hour", 0) / 100
+                self.log(f"Found available instance: {selected_type} in {selected_region} (${price:.2f}/hr)")
                 break
 
         if not selected_type:
@@ -202,13 +246,15 @@ class LambdaLabsTrainer:
                 result = subprocess.run(
                     [
                         "ssh",
-                        "-i", self.ssh_key,
-                        "-o", "StrictHostKeyChecking=no",
+                        *self.ssh_options(),
                         "-o", "ConnectTimeout=5",
                         f"{self.ssh_user}@{self.instance_ip}",
                         "echo", "SSH ready"
                     ],
-                    capture_output=True,
+                    # Not captured: the first success leaves the background
+                    # master running, which would keep a captured pipe open.
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
                     timeout=10,
                 )
                 if result.returncode == 0:
@@ -221,6 +267,44 @@ class LambdaLabsTrainer:
 
         raise TimeoutError(f"SSH did not become available within {timeout} seconds")
 
+    def start_torch_install(self) -> Optional[subprocess.Popen]:
+        """Start creating the remote venv and installing PyTorch in the background.
+
+        The ~2GB torch download runs while the code is uploaded;
+        run_remote_training's own install step then finds it already satisfied.
+        """
+        self.log("Installing PyTorch on instance in the background...")
+
+        if self.dry_run:
+            self.log("DRY RUN: Would install PyTorch in the background", "INFO")
+            return None
+
+        return subprocess.Popen(
+            [
+                "ssh",
+                *self.ssh_options(),
+                f"{self.ssh_user}@{self.instance_ip}",
+                "mkdir -p mutualaid/training/peft && cd mutualaid/training/peft"
+                " && python3 -m venv .venv"
+                " && .venv/bin/pip install --quiet torch==2.4.1 --index-url https://download.pytorch.org/whl/cu121",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+
+    def wait_for_torch_install(self, proc: Optional[subprocess.Popen]) -> None:
+        """Wait for the background PyTorch install started by start_torch_install."""
+        if proc is None:
+            return
+
+        _, stderr = proc.communicate()
+        if proc.returncode != 0:
+            # Not fatal: run_remote_training installs torch itself if needed
+            self.log(f"Background PyTorch install failed: {stderr.strip()}", "WARNING")
+        else:
+            self.log("PyTorch installed on instance")
+
     def upload_code_and_data(self) -> None:
         """Upload project code and training data to instance."""
         self.log("Uploading code and training data...")
@@ -233,8 +317,7 @@ class LambdaLabsTrainer:
         subprocess.run(
             [
                 "ssh",
-                "-i", self.ssh_key,
-                "-o", "StrictHostKeyChecking=no",
+                *self.ssh_options(),
                 f"{self.ssh_user}@{self.instance_ip}",
                 "mkdir", "-p", "mutualaid/training/peft"
             ],
@@ -247,7 +330,9 @@ class LambdaLabsTrainer:
             [
                 "rsync",
                 "-avz",
-                "-e", f"ssh -i {self.ssh_key} -o StrictHostKeyChecking=no",
+                "--compress-level=3",
+                "-e", "ssh " + shlex.join(self.ssh_options()),
+                "--exclude", ".venv",
                 "--exclude", "checkpoints",
                 "--exclude", "logs",
                 "--exclude", "__pycache__",
@@ -277,7 +362,8 @@ cd mutualaid/training/peft
 python3 -m venv .venv
 source .venv/bin/activate
 
-# Install PyTorch with CUDA 12.1 support
+# Install PyTorch with CUDA 12.1 support (normally already done by the
+# background install started before the upload)
 pip install --quiet torch==2.4.1 --index-url https://download.pytorch.org/whl/cu121
 
 # Install other dependencies
@@ -294,36 +380,52 @@ python train.py \\
   --num-epochs 3 \\
   --learning-rate 2e-4 \\
   --max-length 1024 \\
-  --eval-ratio 0.1
+  --eval-ratio 0.1 \\
+  --save-final-only
 
 echo "Training complete!"
 """
 
-        # Write script to temp file and execute
+        # Feed the script to a remote `bash -s` on stdin rather than quoting it
+        # into the ssh command line, and stream its output as it runs.
         self.log("Executing remote training script...")
-        result = subprocess.run(
+        timeout = 7200  # 2-hour timeout
+        proc = subprocess.Popen(
             [
                 "ssh",
-                "-i", self.ssh_key,
-                "-o", "StrictHostKeyChecking=no",
+                *self.ssh_options(),
                 f"{self.ssh_user}@{self.instance_ip}",
-                f"bash -c '{remote_script}'"
+                "bash", "-s",
             ],
-            capture_output=True,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
             text=True,
-            timeout=7200,  # 2-hour timeout
         )
+        timer = threading.Timer(timeout, proc.kill)
+        timer.start()
 
         # Save training logs
         log_file = self.log_dir / "training_output.log"
-        with open(log_file, "w") as f:
-            f.write("=== STDOUT ===\n")
-            f.write(result.stdout)
-            f.write("\n\n=== STDERR ===\n")
-            f.write(result.stderr)
-
-        if result.returncode != 0:
-            self.log(f"Training failed with exit code {result.returncode}", "ERROR")
+        start_time = time.time()
+        try:
+            proc.stdin.write(remote_script)
+            proc.stdin.close()
+            with open(log_file, "w") as f:
+                for line in proc.stdout:
+                    print(line, end="")
+                    f.write(line)
+            returncode = proc.wait()
+        finally:
+            timer.cancel()
+
+        if returncode != 0 and time.time() - start_time >= timeout:
+            self.log(f"Training timed out after {timeout} seconds", "ERROR")
+            self.log(f"See logs at: {log_file}", "ERROR")
+            raise TimeoutError(f"Remote training did not finish within {timeout} seconds")
+
+        if returncode != 0:
+            self.log(f"Training failed with exit code {returncode}", "ERROR")
             self.log(f"See logs at: {log_file}", "ERROR")
             raise RuntimeError("Remote training failed")
 
@@ -345,7 +447,7 @@ echo "Training complete!"
             [
                 "rsync",
                 "-avz",
-                "-e", f"ssh -i {self.ssh_key} -o StrictHostKeyChecking=no",
+                "-e", "ssh " + shlex.join(self.ssh_options()),
                 f"{self.ssh_user}@{self.instance_ip}:mutualaid/training/peft/checkpoints/slack-lora-{self.version}/",
                 f"{self.output_dir}/"
             ],
@@ -373,6 +475,8 @@ echo "Training complete!"
             self.log("DRY RUN: Would terminate instance", "INFO")
             return
 
+        self.close_ssh()
+
         try:
             payload = {"instance_ids": [self.instance_id]}
             self.api_request("POST", "/instance-operations/terminate", json=payload)
@@ -441,8 +545,16 @@ echo "Training complete!"
             # Step 2: Wait for SSH
             self.wait_for_ssh()
 
-            # Step 3: Upload code and data
-            self.upload_code_and_data()
+            # Step 3: Upload code and data while PyTorch installs remotely
+            torch_install = self.start_torch_install()
+            try:
+                self.upload_code_and_data()
+            except Exception:
+                if torch_install is not None:
+                    torch_install.kill()
+                    torch_install.wait()
+                raise
+            self.wait_for_torch_install(torch_install)
 
             # Step 4: Run training
             self.run_remote_training()
@@ -468,6 +580,8 @@ echo "Training complete!"
             # Always cleanup instance
             if not self.dry_run:
                 self.cleanup_instance()
+            self.session.close()
+            self.close_log()
 
 
 def main():
@@ -11,38 +11,65 @@ Usage:
 
 import argparse
 import json
+import os
 import sys
+from operator import itemgetter
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 
+import orjson
+
 
 class ModelRegistry:
     """Manage model versions and metadata."""
 
     def __init__(self, registry_path: Optional[Path] = None):
+        # Adapter paths in the registry are relative to training/peft
+        self.base_dir = Path(__file__).resolve().parent
         if registry_path is None:
-            self.registry_path = Path(__file__).resolve().parent / "model_registry.json"
+            self.registry_path = self.base_dir / "model_registry.json"
         else:
             self.registry_path = Path(registry_path)
 
         self.data = self.load()
+        self.index_models()
+
+    def index_models(self) -> None:
+        """Rebuild the version -> model lookup (first entry wins, as in a scan)."""
+        self.by_version: Dict[str, Dict[str, Any]] = {}
+        for model in self.list_models():
+            if "version" in model:
+                self.by_version.setdefault(model["version"], model)
 
     def load(self) -> Dict[str, Any]:
         """Load registry from disk."""
         if not self.registry_path.exists():
             return {"models": [], "active_version": None}
 
+        raw = self.registry_path.read_bytes()
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+
+        # orjson is strict (e.g. it rejects NaN); give the stdlib parser a try
         try:
-            with open(self.registry_path) as f:
-                return json.load(f)
+            return json.loads(raw)
         except json.JSONDecodeError:
             print(f"Warning: Corrupted registry file at {self.registry_path}", file=sys.stderr)
             return {"models": [], "active_version": None}
 
     def save(self) -> None:
         """Save registry to disk."""
-        with open(self.registry_path, "w") as f:
-            json.dump(self.data, f, indent=2)
+        # Encode up front so the file gets a single write, into a temp file
+        # that replaces the registry atomically (a crash never leaves it torn)
+        payload = json.dumps(self.data, indent=2)
+        tmp_path = self.registry_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.registry_path)
 
     def list_models(self) -> List[Dict[str, Any]]:
         """Get all registered models."""
@@ -50,10 +77,7 @@ class ModelRegistry:
 
     def get_model(self, version: str) -> Optional[Dict[str, Any]]:
         """Get model by version."""
-        for model in self.list_models():
-            if model.get("version") == version:
-                return model
-        return None
+        return self.by_version.get(version)
 
     def get_active_version(self) -> Optional[str]:
         """Get the currently active model version."""
@@ -78,14 +102,14 @@ class ModelRegistry:
 
     def delete_model(self, version: str) -> bool:
         """Remove model from registry (does not delete files)."""
-        models = self.list_models()
-        updated_models = [m for m in models if m.get("version") != version]
-
-        if len(updated_models) == len(models):
+        if version not in self.by_version:
             print(f"Error: Model version '{version}' not found in registry", file=sys.stderr)
             return False
 
-        self.data["models"] = updated_models
+        # One filtering pass (also drops duplicate entries for the version);
+        # no other entry changes, so the index only loses this key.
+        del self.by_version[version]
+        self.data["models"] = [m for m in self.list_models() if m.get("version") != version]
 
         # If deleting active model, clear active version
         if self.get_active_version() == version:
@@ -108,9 +132,7 @@ class ModelRegistry:
         if not adapter_path_str:
             return None
 
-        # Resolve relative to training/peft directory
-        base_dir = Path(__file__).resolve().parent
-        adapter_path = base_dir / adapter_path_str
+        adapter_path = self.base_dir / adapter_path_str
 
         return adapter_path if adapter_path.exists() else None
 
@@ -126,7 +148,11 @@ def cmd_list(registry: ModelRegistry, args) -> int:
 
     print(f"Registered models ({len(models)}):\n")
 
-    for model in sorted(models, key=lambda m: m.get("created_at", ""), reverse=True):
+    # Look each sort key up once rather than on every comparison
+    decorated = [(model.get("created_at", ""), model) for model in models]
+    decorated.sort(key=itemgetter(0), reverse=True)
+
+    for _, model in decorated:
         version = model.get("version", "unknown")
         created_at = model.get("created_at", "unknown")
         training_records = model.get("training_records", 0)
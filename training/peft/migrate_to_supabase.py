@@ -11,13 +11,15 @@ This script:
 3. Creates a backup of the JSONL file before migration
 """
 
-import json
 import os
 import pathlib
 import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
+import orjson
 from dotenv import load_dotenv
+from postgrest.types import ReturnMethod
 from supabase import create_client
 
 # Load environment variables
@@ -29,6 +31,90 @@ else:
 
 BASE = pathlib.Path(__file__).resolve().parent
 AUDIT_PATH = BASE / "data" / "slack_messages_audited.jsonl"
+UPSERT_BATCH_SIZE = 500  # rows per upsert request
+UPLOAD_WORKERS = 8  # concurrent upsert requests
+
+def copy_backup(src, dst):
+    """Copy src to dst with its metadata, like shutil.copy2.
+
+    On Linux, os.copy_file_range keeps the copy inside the kernel (and can
+    reflink on filesystems that support it); anything else falls back to
+    shutil.copy2.
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            shutil.copystat(src, dst)
+            return
+        except OSError:
+            pass
+    shutil.copy2(src, dst)
+
+def make_backup(src, dst):
+    """Snapshot src at dst; returns True if it was hardlinked rather than copied.
+
+    The migration only reads src, so a hardlink is an O(1) snapshot that
+    shares its blocks. The link stops being an independent backup if src is
+    later edited in place, and deleting it frees no space until src is gone.
+    """
+    try:
+        os.link(src, dst)
+        return True
+    except OSError:
+        # Different filesystem, or links not supported
+        copy_backup(src, dst)
+        return False
+
+def count_lines(path):
+    """Count the lines in a file by scanning it in 1 MiB blocks."""
+    lines = 0
+    last = b"\n"
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    # A last line without a trailing newline still counts
+    return lines + (last != b"\n")
+
+def iter_records(path):
+    """Yield each parsed record from a JSONL file, warning on unparseable lines."""
+    with path.open("rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                print(f"   ⚠ Warning: Failed to parse line: {e}")
+
+def upload_batch(table, batch):
+    """Upsert a batch of rows in one request; returns (success, error) counts.
+
+    If the batch request fails, retry its rows one at a time so the failing
+    records are reported individually.
+    """
+    try:
+        table.upsert(batch, returning=ReturnMethod.minimal).execute()
+        return len(batch), 0
+    except Exception as e:
+        print(f"   ⚠ Warning: Batch upload failed ({e}), retrying rows individually")
+
+    success_count = 0
+    error_count = 0
+    for row in batch:
+        try:
+            table.upsert(row, returning=ReturnMethod.minimal).execute()
+            success_count += 1
+        except Exception as e:
+            error_count += 1
+            print(f"   ⚠ Warning: Failed to upload record {row['data'].get('id')}: {e}")
+    return success_count, error_count
 
 def main():
     print("=" * 60)
@@ -52,22 +138,25 @@ def main():
     # Create backup
     backup_path = AUDIT_PATH.with_suffix(f".jsonl.backup-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
     print(f"\n1. Creating backup: {backup_path.name}")
-    shutil.copy2(AUDIT_PATH, backup_path)
-    print(f"   ✓ Backup created")
+    if make_backup(AUDIT_PATH, backup_path):
+        print(f"   ✓ Backup created (hardlink: shares disk space with the original)")
+    else:
+        print(f"   ✓ Backup created")
 
     # Load records from JSONL
-    print(f"\n2. Loading records from {AUDIT_PATH.name}")
-    records = []
-    with AUDIT_PATH.open() as f:
-        for line in f:
-            try:
-                records.append(json.loads(line))
-            except Exception as e:
-                print(f"   ⚠ Warning: Failed to parse line: {e}")
-                continue
-    print(f"   ✓ Loaded {len(records)} records")
-
-    if not records:
+    line_count = count_lines(AUDIT_PATH)
+    print(f"\n2. Loading records from {AUDIT_PATH.name} ({line_count} lines)")
+    # Batches upload concurrently, so their order is not guaranteed; keep only
+    # the last record per id (the same row sequential upserts would leave).
+    record_count = 0
+    rows = {}
+    for rec in iter_records(AUDIT_PATH):
+        rec_id = str(rec.get("id"))
+        rows[rec_id] = {"id": rec_id, "data": rec}
+        record_count += 1
+    print(f"   ✓ Loaded {record_count} records ({len(rows)} unique ids)")
+
+    if not rows:
         print("\n❌ No records to migrate")
         return 1
 
@@ -81,24 +170,28 @@ def main():
         return 1
 
     # Upload records
-    print(f"\n4. Uploading {len(records)} records to Supabase...")
+    print(f"\n4. Uploading {len(rows)} records to Supabase...")
     success_count = 0
     error_count = 0
 
-    for i, rec in enumerate(records, 1):
-        try:
-            rec_id = str(rec.get("id"))
-            supabase.table("slack_messages_audited").upsert({
-                "id": rec_id,
-                "data": rec
-            }).execute()
-            success_count += 1
-
-            if i % 10 == 0 or i == len(records):
-                print(f"   Progress: {i}/{len(records)} records uploaded")
-        except Exception as e:
-            error_count += 1
-            print(f"   ⚠ Warning: Failed to upload record {rec.get('id')}: {e}")
+    payloads = list(rows.values())
+    batches = [
+        payloads[start:start + UPSERT_BATCH_SIZE]
+        for start in range(0, len(payloads), UPSERT_BATCH_SIZE)
+    ]
+
+    # One table builder for every upsert; the postgrest client underneath
+    # already keeps a pooled HTTP/2 connection. Rows are not echoed back.
+    table = supabase.table("slack_messages_audited")
+    uploaded = 0
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        futures = {executor.submit(upload_batch, table, batch): len(batch) for batch in batches}
+        for future in as_completed(futures):
+            batch_success, batch_errors = future.result()
+            success_count += batch_success
+            error_count += batch_errors
+            uploaded += futures[future]
+            print(f"   Progress: {uploaded}/{len(rows)} records uploaded")
 
     print(f"\n   ✓ Upload complete!")
     print(f"     Success: {success_count}")
@@ -112,11 +205,11 @@ def main():
         db_count = response.count
         print(f"   ✓ Database contains {db_count} records")
 
-        if db_count == len(records):
+        if db_count == len(rows):
             print(f"   ✓ Record count matches!")
         else:
             print(f"   ⚠ Warning: Record count mismatch")
-            print(f"     JSONL: {len(records)}")
+            print(f"     JSONL: {len(rows)} unique ids")
             print(f"     Database: {db_count}")
     except Exception as e:
         print(f"   ⚠ Warning: Could not verify: {e}")
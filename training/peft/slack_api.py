@@ -11,18 +11,33 @@ If the parsed JSONL is missing, it will call extract_slack_regex.py to generate
 
 from __future__ import annotations
 
+import bisect
+import functools
 import json
 import os
 import pathlib
+import re
 import subprocess
 import sys
-from typing import List, Dict, Any
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import List, Dict, Any, Optional
 
 from fastapi import FastAPI, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+import orjson
 from dotenv import load_dotenv
+from postgrest.types import ReturnMethod
 from supabase import create_client, Client
 
+try:
+  import ahocorasick
+except ImportError:  # optional; alias matching falls back to a substring scan
+  ahocorasick = None
+
 # Load environment variables from .env.local or .env
 env_local = pathlib.Path(__file__).resolve().parent.parent.parent / ".env.local"
 if env_local.exists():
@@ -34,6 +49,7 @@ BASE = pathlib.Path(__file__).resolve().parent
 DATA_PATH = BASE / "data" / "slack_messages_parsed.jsonl"
 ALIASES_PATH = BASE / "data" / "location_aliases.json"
 EXTRACT_SCRIPT = BASE / "extract_slack_regex.py"
+AUDITED_CACHE_TTL = 30  # seconds to reuse Supabase reads between requests
 
 # Supabase configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -65,11 +81,33 @@ def ensure_parsed_file() -> pathlib.Path:
   return DATA_PATH
 
 
+# Byte table keeping a-z and 0-9 and turning every other byte into a space
+NORMALIZE_TABLE = bytes(
+  byte if (0x61 <= byte <= 0x7A or 0x30 <= byte <= 0x39) else 0x20
+  for byte in range(256)
+)
+
+# Lead-ins like "SWC picked up this morning at X", one alternative per form.
+# Each alternative repeats the prefix so they are tried in order, each with
+# its own backtracking, exactly like separate matches; the location is the
+# one capture group that took part (m.lastindex).
+LEAD_IN_RE = re.compile(
+  r"^(?:"
+  r"[A-Za-z0-9 /&'’.-]+\s+picked\s+up\s+(?:this\s+morning|earlier\s+today|today)?\s+at\s+(.+)"
+  r"|[A-Za-z0-9 /&'’.-]+\s+picked\s+up\s+at\s+(.+)"
+  r"|[A-Za-z0-9 /&'’.-]+\s+picked\s+up\s+from\s+(.+)"
+  r"|[A-Za-z0-9 /&'’.-]+\s+took\s+(?:directly\s+)?from\s+(.+)"
+  r")$",
+  re.IGNORECASE,
+)
+FROM_PREFIX_RE = re.compile(r"^\s*from\s+", re.IGNORECASE)
+
+
 def _normalize_loc(value: str) -> str:
-  import re
-  clean = re.sub(r"[^a-z0-9 ]+", " ", str(value or "").lower()).strip()
-  clean = re.sub(r"\s+", " ", clean)
-  return clean
+  # Lowercase first (some non-ASCII letters lowercase to ASCII), then any
+  # remaining non-ASCII character becomes "?" and, via the table, a space.
+  clean = str(value or "").lower().encode("ascii", "replace").translate(NORMALIZE_TABLE)
+  return b" ".join(clean.split()).decode("ascii")
 
 
 DEFAULT_LOCATION_ALIASES = {
@@ -103,8 +141,7 @@ DEFAULT_LOCATION_ALIASES = {
 
 def load_alias_map() -> Dict[str, str]:
   try:
-    with ALIASES_PATH.open() as f:
-      data = json.load(f)
+    data = orjson.loads(ALIASES_PATH.read_bytes())
   except FileNotFoundError:
     return dict(DEFAULT_LOCATION_ALIASES)
   except Exception as exc:
@@ -123,93 +160,380 @@ def load_alias_map() -> Dict[str, str]:
   return aliases
 
 
+def build_keyword_matcher(keywords: Dict[str, Any]) -> Optional[Any]:
+  """Aho-Corasick automaton over the keys of `keywords`, valued (rank, value)."""
+  if ahocorasick is None or not any(keywords):
+    return None
+  automaton = ahocorasick.Automaton()
+  for rank, (keyword, value) in enumerate(keywords.items()):
+    if keyword:
+      automaton.add_word(keyword, (rank, value))
+  automaton.make_automaton()
+  return automaton
+
+
+def first_keyword_match(text: str, keywords: Dict[str, Any], matcher: Optional[Any]) -> Any:
+  """Value of the earliest key in `keywords` found inside `text`, or None.
+
+  `matcher` is build_keyword_matcher(keywords); without one (no
+  pyahocorasick) the keys are scanned in order.
+  """
+  if matcher is not None:
+    # One pass finds every key inside text; the lowest rank is the first in order
+    first = min((hit for _, hit in matcher.iter(text)), default=None)
+    return first[1] if first else None
+  for keyword, value in keywords.items():
+    if keyword and keyword in text:
+      return value
+  return None
+
+
 LOCATION_ALIASES = load_alias_map()
+ALIAS_MATCHER = build_keyword_matcher(LOCATION_ALIASES)
 
 
 def canonical_loc(value: str) -> str:
   if not value:
     return ""
-  import re
+  return _canonical_loc(str(value))
+
 
-  cleaned = str(value or "").strip()
+# The same few dozen venue strings repeat across thousands of records.
+# Depends on LOCATION_ALIASES/ALIAS_MATCHER, so clear it whenever the aliases
+# are reloaded.
+@functools.lru_cache(maxsize=4096)
+def _canonical_loc(value: str) -> str:
+  cleaned = value.strip()
 
   # Strip common lead-ins like "SWC picked up this morning at X"
-  lead_patterns = [
-    r"^[A-Za-z0-9 /&'’.-]+\s+picked\s+up\s+(?:this\s+morning|earlier\s+today|today)?\s+at\s+(.+)$",
-    r"^[A-Za-z0-9 /&'’.-]+\s+picked\s+up\s+at\s+(.+)$",
-    r"^[A-Za-z0-9 /&'’.-]+\s+picked\s+up\s+from\s+(.+)$",
-    r"^[A-Za-z0-9 /&'’.-]+\s+took\s+(?:directly\s+)?from\s+(.+)$",
-  ]
-  for pat in lead_patterns:
-    m = re.match(pat, cleaned, flags=re.IGNORECASE)
-    if m:
-      cleaned = m.group(1).strip(" :-")
-      break
+  m = LEAD_IN_RE.match(cleaned)
+  if m:
+    cleaned = m.group(m.lastindex).strip(" :-")
 
   # If a trailing "at <location>" remains and it contains Mariano's, keep just the location.
   lower_clean = cleaned.lower()
   if " mariano" in lower_clean and " at " in lower_clean:
-    before, after = cleaned.rsplit(" at ", 1)
-    if after.strip():
+    # The check is case-insensitive but the split is not; " AT " alone is left as is
+    _, sep, after = cleaned.rpartition(" at ")
+    if sep and after.strip():
       cleaned = after.strip(" :-")
 
-  cleaned = re.sub(r"^\s*from\s+", "", cleaned, flags=re.IGNORECASE)
-  cleaned = cleaned.split("\n")[0]
-  cleaned = cleaned.split("(")[0]
-  cleaned = re.sub(r"\s*[:;,-]+\s*$", "", cleaned)
-  cleaned = re.sub(r"\btook\b\s*$", "", cleaned, flags=re.IGNORECASE).strip()
+  cleaned = FROM_PREFIX_RE.sub("", cleaned)
+
+  # Keep only what comes before the first newline or "("
+  cut = len(cleaned)
+  for stop in ("\n", "("):
+    idx = cleaned.find(stop, 0, cut)
+    if idx >= 0:
+      cut = idx
+  cleaned = cleaned[:cut]
+
+  # Drop a trailing run of : ; , - together with the whitespace around it
+  stripped = cleaned.rstrip()
+  if stripped.endswith((":", ";", ",", "-")):
+    cleaned = stripped.rstrip(":;,-").rstrip()
+
+  # Drop a trailing standalone "took"
+  stripped = cleaned.rstrip()
+  if stripped[-4:].lower() == "took" and not (
+    len(stripped) > 4 and (stripped[-5].isalnum() or stripped[-5] == "_")
+  ):
+    cleaned = stripped[:-4]
+  cleaned = cleaned.strip()
 
   key = _normalize_loc(cleaned)
   if key in LOCATION_ALIASES:
     return LOCATION_ALIASES[key]
-  for alias_key, canonical in LOCATION_ALIASES.items():
-    if alias_key and key and alias_key in key:
-      return canonical
-  return ""
+  if not key:
+    return ""
+  return first_keyword_match(key, LOCATION_ALIASES, ALIAS_MATCHER) or ""
+
+
+LB_UNITS = frozenset({"lb", "lbs", "pound", "pounds"})
+
+
+def normalize_lb_items(obj_items: List[Dict[str, Any]]) -> float:
+  """Set estimated_lbs from the quantity of pound-unit items; returns the items' total estimated_lbs."""
+  total = 0.0
+  for itm in obj_items or []:
+    unit = (itm.get("unit") or "").lower()
+    if unit in LB_UNITS:
+      try:
+        qty_val = float(itm.get("quantity") or 0)
+      except (TypeError, ValueError):
+        qty_val = 0.0
+      if qty_val > 0:
+        itm["estimated_lbs"] = round(qty_val, 2)
+    lbs = itm.get("estimated_lbs")
+    if lbs is not None:
+      try:
+        total += float(lbs)
+      except (TypeError, ValueError):
+        pass
+  return total
 
 
 def load_records() -> List[Dict[str, Any]]:
   path = ensure_parsed_file()
   records = []
-  with path.open() as f:
-    for line in f:
-      rec = json.loads(line)
-      items = rec.get("items") or []
-
-      def normalize_lb_items(obj_items: List[Dict[str, Any]]) -> None:
-        for itm in obj_items or []:
-          unit = (itm.get("unit") or "").lower()
-          if unit in {"lb", "lbs", "pound", "pounds"}:
-            try:
-              qty_val = float(itm.get("quantity") or 0)
-            except (TypeError, ValueError):
-              qty_val = 0.0
-            if qty_val > 0:
-              itm["estimated_lbs"] = round(qty_val, 2)
-
-      normalize_lb_items(items)
-      total_estimated_lbs = 0.0
-      for item in items:
-        lbs = item.get("estimated_lbs")
-        try:
-          val = float(lbs)
-        except (TypeError, ValueError):
-          val = 0.0
-        total_estimated_lbs += val
-      rec["total_estimated_lbs"] = round(total_estimated_lbs, 2)
+  # One read and orjson per line instead of text-mode iteration + json.loads
+  for line in path.read_bytes().splitlines():
+    if not line.strip():
+      continue
+    rec = orjson.loads(line)
+    rec["total_estimated_lbs"] = round(normalize_lb_items(rec.get("items")), 2)
+    # Only backfill canonical locations the file doesn't already carry
+    if rec.get("rescue_location_canonical") is None:
       rec["rescue_location_canonical"] = canonical_loc(rec.get("rescue_location"))
+    if rec.get("drop_off_location_canonical") is None:
       rec["drop_off_location_canonical"] = canonical_loc(rec.get("drop_off_location"))
-      if isinstance(rec.get("sections"), list):
-        for sec in rec["sections"]:
-          if isinstance(sec, dict):
+    if isinstance(rec.get("sections"), list):
+      for sec in rec["sections"]:
+        if isinstance(sec, dict):
+          if sec.get("location_canonical") is None:
             sec["location_canonical"] = canonical_loc(sec.get("location"))
-            normalize_lb_items(sec.get("items") or [])
-      records.append(rec)
+          normalize_lb_items(sec.get("items") or [])
+    records.append(rec)
   return records
 
 
-def load_audited() -> List[Dict[str, Any]]:
-  """Load audited records from both slack_messages_audited and rescue_logs tables."""
+def search_texts(rec: Dict[str, Any]) -> List[str]:
+  """Lowercased text of every field /search looks at (raw and canonical forms)."""
+  texts = [" ".join(str(msg) for msg in rec.get("raw_messages") or []).lower()]
+  for key in ("rescue_location_canonical", "rescue_location", "drop_off_location_canonical", "drop_off_location"):
+    texts.append(str(rec.get(key) or "").lower())
+  for item in rec.get("items") or []:
+    if isinstance(item, dict):
+      texts.append(str(item.get("name") or "").lower())
+  for section in rec.get("sections") or []:
+    if not isinstance(section, dict):
+      continue
+    texts.append(str(section.get("location_canonical") or "").lower())
+    texts.append(str(section.get("location") or "").lower())
+    for item in section.get("items") or []:
+      if isinstance(item, dict):
+        texts.append(str(item.get("name") or "").lower())
+  return texts
+
+
+def search_fields(rec: Dict[str, Any]) -> tuple:
+  """Lowercased fields /search matches against, in the order it reports them.
+
+  (raw messages, rescue location, drop-off location, item names,
+  [(section location, section item names), ...]); locations prefer the
+  canonical form.
+  """
+  items = [str(item.get("name") or "").lower() for item in rec.get("items") or [] if isinstance(item, dict)]
+  sections = [
+    (
+      str(section.get("location_canonical") or section.get("location") or "").lower(),
+      [str(item.get("name") or "").lower() for item in section.get("items") or [] if isinstance(item, dict)],
+    )
+    for section in rec.get("sections") or []
+    if isinstance(section, dict)
+  ]
+  return (
+    " ".join(str(msg) for msg in rec.get("raw_messages") or []).lower(),
+    str(rec.get("rescue_location_canonical") or rec.get("rescue_location") or "").lower(),
+    str(rec.get("drop_off_location_canonical") or rec.get("drop_off_location") or "").lower(),
+    items,
+    sections,
+  )
+
+
+def build_search_index(records: List[Dict[str, Any]]) -> Dict[str, set]:
+  """Map each 3-character substring to the indices of records containing it.
+
+  /search matches terms as substrings, so this trigram index only narrows the
+  records to check: any record containing a term contains all of its trigrams.
+  """
+  index: Dict[str, set] = defaultdict(set)
+  for idx, rec in enumerate(records):
+    grams = set()
+    for text in search_texts(rec):
+      grams.update(text[i:i + 3] for i in range(len(text) - 2))
+    for gram in grams:
+      index[gram].add(idx)
+  return dict(index)
+
+
+def search_candidates(query_terms: List[str]) -> List[int]:
+  """Indices into RECORDS that may match every term (terms under 3 chars don't narrow)."""
+  grams = {term[i:i + 3] for term in query_terms for i in range(len(term) - 2)}
+  if not grams:
+    return list(range(len(RECORDS)))
+  postings = sorted((SEARCH_INDEX.get(gram, set()) for gram in grams), key=len)
+  return sorted(postings[0].intersection(*postings[1:]))
+
+
+def record_date(rec: Dict[str, Any]):
+  """Calendar date of a record's start_ts (or end_ts), or None if missing/unparseable."""
+  ts = rec.get("start_ts") or rec.get("end_ts")
+  if not ts:
+    return None
+  try:
+    return datetime.fromisoformat(ts.replace("Z", "+00:00")).date()
+  except Exception:
+    return None
+
+
+def build_id_index(records: List[Dict[str, Any]]) -> Dict[Any, int]:
+  """Record id -> index of its first record, for O(1) lookup by id."""
+  index: Dict[Any, int] = {}
+  for idx, rec in enumerate(records):
+    rec_id = rec.get("id")
+    if rec_id is not None:
+      index.setdefault(rec_id, idx)
+  return index
+
+
+def build_date_index(records: List[Dict[str, Any]]) -> List[tuple]:
+  """(date, record index) pairs sorted by date; undated records are left out."""
+  dated = ((record_date(rec), idx) for idx, rec in enumerate(records))
+  return sorted(entry for entry in dated if entry[0] is not None)
+
+
+def parse_date_param(value: str | None, name: str):
+  """Date for an optional YYYY-MM-DD query parameter; HTTP 400 if it doesn't parse."""
+  if not value:
+    return None
+  try:
+    return datetime.fromisoformat(value).date()
+  except ValueError:
+    raise HTTPException(status_code=400, detail=f"Invalid {name}: expected YYYY-MM-DD") from None
+
+
+def date_window(start_day, end_day) -> tuple:
+  """Bounds of the SORTED_BY_TS slice dated within [start_day, end_day] (None leaves a side open)."""
+  lo, hi = 0, len(SORTED_BY_TS)
+  if start_day is not None:
+    lo = bisect.bisect_left(SORTED_BY_TS, (start_day, -1))
+  if end_day is not None:
+    hi = bisect.bisect_right(SORTED_BY_TS, (end_day, sys.maxsize))
+  return lo, hi
+
+
+def records_in_date_range(start_day, end_day) -> List[Dict[str, Any]]:
+  """RECORDS dated within [start_day, end_day], in file order."""
+  lo, hi = date_window(start_day, end_day)
+  return [RECORDS[idx] for idx in sorted(idx for _, idx in SORTED_BY_TS[lo:hi])]
+
+
+def feed_position(message_id: Any, start_day, end_day, hidden_ids: set) -> tuple:
+  """(total, position) of message_id in the filtered parsed feed.
+
+  Same answer as building the filtered list and scanning it for the
+  first record with this id (position 0 if it was filtered out), but
+  without the list: no filters is an id-index lookup, otherwise two
+  passes over record indices.
+  """
+  if start_day is None and end_day is None:
+    if not hidden_ids:
+      return len(RECORDS), RECORD_INDEX_BY_ID.get(message_id, 0)
+    indices = range(len(RECORDS))
+  else:
+    lo, hi = date_window(start_day, end_day)
+    indices = [idx for _, idx in SORTED_BY_TS[lo:hi]]
+
+  total = 0
+  target = None
+  for idx in indices:
+    rec_id = RECORDS[idx].get("id")
+    if rec_id in hidden_ids:
+      continue
+    total += 1
+    if rec_id == message_id and (target is None or idx < target):
+      target = idx
+  if target is None:
+    return total, 0
+  position = sum(1 for idx in indices if idx < target and RECORDS[idx].get("id") not in hidden_ids)
+  return total, position
+
+
+def filter_by_date(records: List[Dict[str, Any]], start_day, end_day) -> List[Dict[str, Any]]:
+  """Unindexed counterpart of records_in_date_range for an arbitrary record list."""
+  filtered = []
+  for rec in records:
+    day = record_date(rec)
+    if day is None or (start_day is not None and day < start_day) or (end_day is not None and day > end_day):
+      continue
+    filtered.append(rec)
+  return filtered
+
+
+def ttl_cache(seconds: float):
+  """Cache a function's result per positional arguments for `seconds`.
+
+  Exceptions are not cached. Like functools.lru_cache, the wrapper exposes
+  cache_clear(). A result whose call started before a cache_clear() is
+  returned but not stored, so a read racing a write can't cache stale rows.
+  """
+  def decorator(fn):
+    entries: Dict[tuple, tuple] = {}
+    generation = 0
+
+    @functools.wraps(fn)
+    def wrapper(*args):
+      entry = entries.get(args)
+      now = time.monotonic()
+      if entry is None or now >= entry[0]:
+        started = generation
+        entry = (now + seconds, fn(*args))
+        if started == generation:
+          entries[args] = entry
+      return entry[1]
+
+    def cache_clear():
+      nonlocal generation
+      generation += 1
+      entries.clear()
+
+    wrapper.cache_clear = cache_clear
+    return wrapper
+  return decorator
+
+
+@ttl_cache(AUDITED_CACHE_TTL)
+def fetch_audited_rows(include_recurring: bool = True) -> List[Dict[str, Any]]:
+  query = supabase.table("slack_messages_audited").select("data")
+  if not include_recurring:
+    # SQL neq drops NULLs, so rows without the flag need their own branch
+    query = query.or_("data->>recurring.is.null,data->>recurring.neq.true")
+  return query.execute().data
+
+
+@ttl_cache(AUDITED_CACHE_TTL)
+def fetch_audited_id_rows() -> List[Dict[str, Any]]:
+  # Only the record id and recurring flag out of the stored JSON
+  return supabase.table("slack_messages_audited").select(
+    "rec_id:data->id", "recurring:data->recurring"
+  ).execute().data
+
+
+@ttl_cache(AUDITED_CACHE_TTL)
+def fetch_rescue_log_rows() -> List[Dict[str, Any]]:
+  # Just the columns load_audited normalizes
+  return supabase.table("rescue_logs").select(
+    "id", "source", "location", "drop_off", "rescued_at", "created_at", "items", "total_estimated_lbs"
+  ).execute().data
+
+
+def clear_audited_cache() -> None:
+  """Drop cached Supabase reads after a write so the next request refetches."""
+  fetch_audited_rows.cache_clear()
+  fetch_audited_id_rows.cache_clear()
+  fetch_rescue_log_rows.cache_clear()
+  cached_audited_ids.cache_clear()
+
+
+def load_audited(include_recurring: bool = True) -> List[Dict[str, Any]]:
+  """Load audited records from both slack_messages_audited and rescue_logs tables.
+
+  With include_recurring=False, recurring event templates are filtered out
+  in the query rather than after download. Table reads are cached for
+  AUDITED_CACHE_TTL seconds; the records are shared between calls, so copy
+  one before changing it.
+  """
   if not USE_SUPABASE or not supabase:
     raise RuntimeError("Supabase not configured. Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY.")
 
@@ -217,16 +541,15 @@ def load_audited() -> List[Dict[str, Any]]:
 
   # Load from slack_messages_audited (audited Slack messages)
   try:
-    response = supabase.table("slack_messages_audited").select("*").execute()
-    for row in response.data:
-      records.append(row["data"])
+    for row in fetch_audited_rows(include_recurring):
+      if include_recurring or not row["data"].get("recurring"):
+        records.append(row["data"])
   except Exception as e:
     print(f"Warning: Could not load from slack_messages_audited: {e}")
 
   # Load from rescue_logs (manual rescue log entries)
   try:
-    response = supabase.table("rescue_logs").select("*").execute()
-    for row in response.data:
+    for row in fetch_rescue_log_rows():
       # Normalize rescue_logs format to match slack_messages_audited format for stats
       items = row.get("items") or []
       normalized = {
@@ -251,11 +574,51 @@ def load_audited() -> List[Dict[str, Any]]:
   return records
 
 
-def save_audited_record(rec: Dict[str, Any]) -> None:
-  """Save audited record to Supabase."""
+@ttl_cache(AUDITED_CACHE_TTL)
+def cached_audited_ids(include_recurring: bool) -> frozenset:
+  # Raises if either table can't be read, so a partial set is never cached
+  ids = {
+    row["rec_id"] for row in fetch_audited_id_rows()
+    if row.get("rec_id") is not None and (include_recurring or not row.get("recurring"))
+  }
+  ids.update(f"rescue-{row['id']}" for row in fetch_rescue_log_rows())
+  return frozenset(ids)
+
+
+def load_audited_ids(include_recurring: bool = True) -> frozenset:
+  """Ids of audited records, without fetching the records themselves.
+
+  The set is cached alongside the table reads, so callers get the same
+  object until the cache expires or is cleared.
+  """
   if not USE_SUPABASE or not supabase:
     raise RuntimeError("Supabase not configured. Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY.")
 
+  try:
+    return cached_audited_ids(include_recurring)
+  except Exception:
+    pass  # Rebuild table by table below, keeping whatever can still be read
+
+  ids = set()
+  try:
+    for row in fetch_audited_id_rows():
+      if row.get("rec_id") is not None and (include_recurring or not row.get("recurring")):
+        ids.add(row["rec_id"])
+  except Exception as e:
+    print(f"Warning: Could not load from slack_messages_audited: {e}")
+
+  # Rescue logs are never recurring
+  try:
+    for row in fetch_rescue_log_rows():
+      ids.add(f"rescue-{row['id']}")
+  except Exception as e:
+    print(f"Warning: Could not load from rescue_logs: {e}")
+
+  return frozenset(ids)
+
+
+def audited_row(rec: Dict[str, Any]) -> Dict[str, Any]:
+  """slack_messages_audited row for rec, with item weights and total_estimated_lbs filled in."""
   rec = {**rec, "audited": True}
 
   # Add estimated weights to items in sections
@@ -274,24 +637,52 @@ def save_audited_record(rec: Dict[str, Any]) -> None:
 
   rec['total_estimated_lbs'] = round(total_lbs, 1) if total_lbs > 0 else None
 
-  rec_id = str(rec.get("id"))
+  return {"id": str(rec.get("id")), "data": rec}
+
+
+def save_audited_record(rec: Dict[str, Any]) -> None:
+  """Save audited record to Supabase."""
+  save_audited_records([rec])
+
+
+def save_audited_records(recs: List[Dict[str, Any]]) -> None:
+  """Save audited records to Supabase in a single upsert."""
+  if not USE_SUPABASE or not supabase:
+    raise RuntimeError("Supabase not configured. Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY.")
+  if not recs:
+    return
 
-  supabase.table("slack_messages_audited").upsert({
-    "id": rec_id,
-    "data": rec
-  }).execute()
+  # The caller already has the rows, so don't have PostgREST echo them back
+  supabase.table("slack_messages_audited").upsert(
+    [audited_row(rec) for rec in recs], returning=ReturnMethod.minimal
+  ).execute()
+  clear_audited_cache()
 
 
 def delete_audited_record(rec_id: Any) -> None:
   """Delete audited record from Supabase."""
+  delete_audited_records([rec_id])
+
+
+def delete_audited_records(rec_ids: List[Any]) -> None:
+  """Delete audited records from Supabase in a single request."""
   if not USE_SUPABASE or not supabase:
     raise RuntimeError("Supabase not configured. Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY.")
+  if not rec_ids:
+    return
 
-  rec_id_str = str(rec_id)
-  supabase.table("slack_messages_audited").delete().eq("id", rec_id_str).execute()
+  id_strs = [str(rec_id) for rec_id in rec_ids]
+  query = supabase.table("slack_messages_audited").delete(returning=ReturnMethod.minimal)
+  if len(id_strs) == 1:
+    query = query.eq("id", id_strs[0])
+  else:
+    query = query.in_("id", id_strs)
+  query.execute()
+  clear_audited_cache()
 
 
-app = FastAPI(title="Slack Regex Browser")
+# orjson serializes the large /messages and /search payloads much faster
+app = FastAPI(title="Slack Regex Browser", default_response_class=ORJSONResponse)
 app.add_middleware(
   CORSMiddleware,
   allow_origins=["*"],
@@ -299,6 +690,8 @@ app.add_middleware(
   allow_methods=["*"],
   allow_headers=["*"],
 )
+# Record pages with raw messages and sections compress well
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 # Load parsed records lazily - don't fail if data file is missing (e.g., in production)
 try:
@@ -307,6 +700,10 @@ except Exception as e:
     print(f"⚠ Warning: Could not load parsed messages: {e}")
     print(f"  Continuing with empty records (audited messages still work via Supabase)")
     RECORDS: List[Dict[str, Any]] = []
+SEARCH_INDEX = build_search_index(RECORDS)
+SEARCH_CORPUS = [search_fields(rec) for rec in RECORDS]
+SORTED_BY_TS = build_date_index(RECORDS)
+RECORD_INDEX_BY_ID = build_id_index(RECORDS)
 
 
 @app.get("/messages")
@@ -319,55 +716,33 @@ def list_messages(
   hide_audited: bool = Query(False, description="If true, exclude audited records from the parsed feed"),
   include_recurring: bool = Query(False, description="If true, include recurring event templates"),
 ):
-  audited_records = load_audited()
-
-  # Filter out recurring events unless explicitly requested
-  if not include_recurring:
-    audited_records = [r for r in audited_records if not r.get("recurring")]
-
-  audited_id_set = {rec.get("id") for rec in audited_records if rec.get("id") is not None}
-  data_source = audited_records if audited else RECORDS
+  if audited:
+    # Recurring event templates are left out unless explicitly requested
+    audited_records = load_audited(include_recurring)
+    audited_id_set = {rec.get("id") for rec in audited_records if rec.get("id") is not None}
+    data_source = audited_records
+  else:
+    audited_id_set = load_audited_ids(include_recurring)
+    data_source = RECORDS
   filtered = data_source
 
-  if start_date or end_date:
-    from datetime import datetime
-
-    def in_range(rec):
-      ts = rec.get("start_ts") or rec.get("end_ts")
-      if not ts:
-        return False
-      try:
-        dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-      except Exception:
-        return False
-      if start_date:
-        try:
-          if dt.date() < datetime.fromisoformat(start_date).date():
-            return False
-        except Exception:
-          pass
-      if end_date:
-        try:
-          if dt.date() > datetime.fromisoformat(end_date).date():
-            return False
-        except Exception:
-          pass
-      return True
-
-    filtered = [rec for rec in filtered if in_range(rec)]
+  start_day = parse_date_param(start_date, "start_date")
+  end_day = parse_date_param(end_date, "end_date")
+  if start_day is not None or end_day is not None:
+    # Audited records change per request, so they are not indexed
+    if audited:
+      filtered = filter_by_date(filtered, start_day, end_day)
+    else:
+      filtered = records_in_date_range(start_day, end_day)
 
   if hide_audited and not audited:
     filtered = [rec for rec in filtered if rec.get("id") not in audited_id_set]
 
-  enriched = []
-  for rec in filtered:
-    annotated = dict(rec)
-    annotated["audited"] = rec.get("id") in audited_id_set
-    enriched.append(annotated)
-
-  total = len(enriched)
+  # Only the returned page gets annotated copies
+  total = len(filtered)
   end = min(start + limit, total)
-  return {"total": total, "records": enriched[start:end], "start": start, "limit": limit, "audited": audited}
+  page = [dict(rec, audited=rec.get("id") in audited_id_set) for rec in filtered[start:end]]
+  return {"total": total, "records": page, "start": start, "limit": limit, "audited": audited}
 
 
 @app.get("/search")
@@ -376,39 +751,36 @@ def search_messages(
   limit: int = Query(50, ge=1, le=500, description="Max results to return"),
 ):
   """Search across all Slack messages by keyword, ignoring audit filters."""
-  audited_records = load_audited()
-  audited_id_set = {rec.get("id") for rec in audited_records if rec.get("id") is not None}
+  audited_id_set = load_audited_ids()
 
   query_lower = query.lower()
   query_terms = query_lower.split()
 
   results = []
 
-  for idx, rec in enumerate(RECORDS):
+  for idx in search_candidates(query_terms):
+    rec = RECORDS[idx]
+    raw_text, rescue, dropoff, item_names, sections = SEARCH_CORPUS[idx]
     matched_in = []
     match_texts = []
 
     # Search raw messages
-    raw_text = ' '.join(rec.get('raw_messages', [])).lower()
     if raw_text and all(term in raw_text for term in query_terms):
       matched_in.append('raw_messages')
       match_texts.append(raw_text)
 
     # Search rescue location
-    rescue = (rec.get('rescue_location_canonical') or rec.get('rescue_location') or '').lower()
     if rescue and all(term in rescue for term in query_terms):
       matched_in.append('rescue_location')
       match_texts.append(rescue)
 
     # Search drop-off location
-    dropoff = (rec.get('drop_off_location_canonical') or rec.get('drop_off_location') or '').lower()
     if dropoff and all(term in dropoff for term in query_terms):
       matched_in.append('drop_off_location')
       match_texts.append(dropoff)
 
     # Search top-level items
-    for item in rec.get('items', []):
-      item_name = (item.get('name') or '').lower()
+    for item_name in item_names:
       if item_name and all(term in item_name for term in query_terms):
         if 'items' not in matched_in:
           matched_in.append('items')
@@ -416,17 +788,15 @@ def search_messages(
         break
 
     # Search sections
-    for section in rec.get('sections', []):
+    for sec_loc, sec_item_names in sections:
       # Search section location
-      sec_loc = (section.get('location_canonical') or section.get('location') or '').lower()
       if sec_loc and all(term in sec_loc for term in query_terms):
         if 'section_location' not in matched_in:
           matched_in.append('section_location')
           match_texts.append(sec_loc)
 
       # Search section items
-      for item in section.get('items', []):
-        item_name = (item.get('name') or '').lower()
+      for item_name in sec_item_names:
         if item_name and all(term in item_name for term in query_terms):
           if 'section_items' not in matched_in:
             matched_in.append('section_items')
@@ -473,8 +843,14 @@ def get_message_by_id(
   hide_audited: bool = Query(False, description="If true, exclude audited records from the parsed feed"),
 ):
   """Get a specific message by ID and return its position in the filtered results."""
-  audited_records = load_audited()
-  audited_id_set = {rec.get("id") for rec in audited_records if rec.get("id") is not None}
+  start_day = parse_date_param(start_date, "start_date")
+  end_day = parse_date_param(end_date, "end_date")
+
+  if audited:
+    audited_records = load_audited()
+    audited_id_set = {rec.get("id") for rec in audited_records if rec.get("id") is not None}
+  else:
+    audited_id_set = load_audited_ids()
 
   # Search ALL records - this endpoint is for direct ID lookup from search results
   # Don't apply date/audit filters since the ID itself is the primary filter
@@ -482,64 +858,44 @@ def get_message_by_id(
 
   # Find the message by ID in ALL records
   target_record = None
-  for rec in all_records:
-    if rec.get("id") == message_id:
-      target_record = rec
-      break
+  if audited:
+    for rec in all_records:
+      if rec.get("id") == message_id:
+        target_record = rec
+        break
+  elif message_id in RECORD_INDEX_BY_ID:
+    target_record = RECORDS[RECORD_INDEX_BY_ID[message_id]]
 
   if target_record is None:
     raise HTTPException(status_code=404, detail=f"Message {message_id} not found")
 
   # Now apply filters ONLY to get the correct position/index for navigation
-  filtered = all_records
-
-  if start_date or end_date:
-    from datetime import datetime
-
-    def in_range(rec):
-      ts = rec.get("start_ts") or rec.get("end_ts")
-      if not ts:
-        return False
-      try:
-        dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-      except Exception:
-        return False
-      if start_date:
-        try:
-          if dt.date() < datetime.fromisoformat(start_date).date():
-            return False
-        except Exception:
-          pass
-      if end_date:
-        try:
-          if dt.date() > datetime.fromisoformat(end_date).date():
-            return False
-        except Exception:
-          pass
-      return True
-
-    filtered = [rec for rec in filtered if in_range(rec)]
-
-  if hide_audited and not audited:
-    filtered = [rec for rec in filtered if rec.get("id") not in audited_id_set]
-
-  # Find the index within filtered results for the UI navigation
-  message_index = None
-  for idx, rec in enumerate(filtered):
-    if rec.get("id") == message_id:
-      message_index = idx
-      break
+  if audited:
+    filtered = all_records
+    if start_day is not None or end_day is not None:
+      filtered = filter_by_date(filtered, start_day, end_day)
+
+    # Find the index within filtered results for the UI navigation
+    message_index = None
+    for idx, rec in enumerate(filtered):
+      if rec.get("id") == message_id:
+        message_index = idx
+        break
 
-  # If message not in filtered results, set index to 0 (show as first item)
-  if message_index is None:
-    message_index = 0
+    # If message not in filtered results, set index to 0 (show as first item)
+    if message_index is None:
+      message_index = 0
+    total = len(filtered)
+  else:
+    hidden_ids = audited_id_set if hide_audited else set()
+    total, message_index = feed_position(message_id, start_day, end_day, hidden_ids)
 
   # Return the target record with its position in filtered results
   annotated = dict(target_record)
   annotated["audited"] = target_record.get("id") in audited_id_set
 
   return {
-    "total": len(filtered),
+    "total": total,
     "records": [annotated],
     "start": message_index,
     "limit": 1,
@@ -549,11 +905,39 @@ def get_message_by_id(
 
 @app.post("/reload")
 def reload_data():
-  global RECORDS
+  global RECORDS, SEARCH_INDEX, SEARCH_CORPUS, SORTED_BY_TS, RECORD_INDEX_BY_ID, LOCATION_ALIASES, ALIAS_MATCHER
+  LOCATION_ALIASES = load_alias_map()
+  ALIAS_MATCHER = build_keyword_matcher(LOCATION_ALIASES)
+  _canonical_loc.cache_clear()
+  clear_audited_cache()
   RECORDS = load_records()
+  SEARCH_INDEX = build_search_index(RECORDS)
+  SEARCH_CORPUS = [search_fields(rec) for rec in RECORDS]
+  SORTED_BY_TS = build_date_index(RECORDS)
+  RECORD_INDEX_BY_ID = build_id_index(RECORDS)
   return {"total": len(RECORDS)}
 
 
+# Per-case weights by keyword in the item name, checked in this order
+CASE_WEIGHT_KEYWORDS = {
+    'produce': 30, 'fruit': 30, 'vegetable': 30,
+    'meat': 40, 'chicken': 40, 'beef': 40,
+    'dairy': 35,
+    'bread': 20, 'baked': 20,
+}
+CASE_WEIGHT_MATCHER = build_keyword_matcher(CASE_WEIGHT_KEYWORDS)
+
+# Item-specific weights (per unit/item), checked in this order
+ITEM_WEIGHTS = {
+    'apple': 0.33, 'banana': 0.25, 'orange': 0.3,
+    'potato': 0.5, 'onion': 0.3, 'carrot': 0.1,
+    'broccoli': 1.5, 'cauliflower': 2, 'lettuce': 1,
+    'milk': 8.6, 'bread': 1.5, 'chicken': 3,
+    'beef': 3, 'pork': 3, 'eggs': 1.5
+}
+ITEM_WEIGHT_MATCHER = build_keyword_matcher(ITEM_WEIGHTS)
+
+
 def estimate_item_weight(item: Dict[str, Any]) -> float | None:
     """Estimate weight in pounds for an item based on quantity, unit, and item name"""
     if not item:
@@ -592,34 +976,22 @@ def estimate_item_weight(item: Dict[str, Any]) -> float | None:
 
     # Case/box weights (estimated by category/item)
     if unit in ['case', 'cases', 'box', 'boxes']:
-        # Item-specific case weights
-        if 'produce' in name or 'fruit' in name or 'vegetable' in name or subcategory == 'produce':
-            return qty * 30
-        if 'meat' in name or 'chicken' in name or 'beef' in name or subcategory == 'meat':
-            return qty * 40
-        if 'dairy' in name or subcategory == 'dairy':
-            return qty * 35
-        if 'bread' in name or 'baked' in name:
-            return qty * 20
+        # Item-specific case weights. A produce/meat/dairy subcategory counts
+        # like its keyword in the name, so it is appended as its own segment.
+        text = name
+        if subcategory in ('produce', 'meat', 'dairy'):
+            text = f"{name}\0{subcategory}"
+        case_weight = first_keyword_match(text, CASE_WEIGHT_KEYWORDS, CASE_WEIGHT_MATCHER)
         # Default case weight
-        return qty * 25
+        return qty * (case_weight or 25)
 
     # Bag weights
     if unit in ['bag', 'bags']:
         return qty * 5
 
-    # Item-specific weights (per unit/item)
-    item_weights = {
-        'apple': 0.33, 'banana': 0.25, 'orange': 0.3,
-        'potato': 0.5, 'onion': 0.3, 'carrot': 0.1,
-        'broccoli': 1.5, 'cauliflower': 2, 'lettuce': 1,
-        'milk': 8.6, 'bread': 1.5, 'chicken': 3,
-        'beef': 3, 'pork': 3, 'eggs': 1.5
-    }
-
-    for item_key, weight in item_weights.items():
-        if item_key in name:
-            return qty * weight
+    item_weight = first_keyword_match(name, ITEM_WEIGHTS, ITEM_WEIGHT_MATCHER)
+    if item_weight is not None:
+        return qty * item_weight
 
     # Fallback by subcategory
     if not unit or unit in ['item', 'items', 'unit', 'units']:
@@ -649,8 +1021,8 @@ def add_estimated_weights(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         result.append(item_copy)
     return result
 
-@app.post("/audit")
-def audit_record(rec: Dict[str, Any]):
+def validate_audit_payload(rec: Any) -> None:
+  """Raise HTTPException unless rec is a well-formed /audit payload."""
   if not isinstance(rec, dict):
     raise HTTPException(status_code=400, detail="Invalid payload: expected JSON object")
   if rec.get("id") is None:
@@ -666,15 +1038,26 @@ def audit_record(rec: Dict[str, Any]):
     if not rec.get("sections") or not isinstance(rec.get("sections"), list):
       raise HTTPException(status_code=400, detail="Recurring event requires sections array")
 
-    # Check for duplicates: same location + day_of_week
-    existing_recurring = [r for r in load_audited() if r.get("recurring") and r.get("id") != rec.get("id")]
-    for existing in existing_recurring:
-      if (existing.get("rescue_location_canonical") == rec.get("rescue_location_canonical") and
-          existing.get("day_of_week") == day_of_week):
-        raise HTTPException(
-          status_code=409,
-          detail=f"A recurring event already exists for {rec.get('rescue_location_canonical')} on this day"
-        )
+
+def check_recurring_conflict(rec: Dict[str, Any], recurring_records: List[Dict[str, Any]]) -> None:
+  """Raise 409 if another recurring event has rec's location and day_of_week."""
+  for existing in recurring_records:
+    if (existing.get("id") != rec.get("id") and
+        existing.get("rescue_location_canonical") == rec.get("rescue_location_canonical") and
+        existing.get("day_of_week") == rec.get("day_of_week")):
+      raise HTTPException(
+        status_code=409,
+        detail=f"A recurring event already exists for {rec.get('rescue_location_canonical')} on this day"
+      )
+
+
+@app.post("/audit")
+def audit_record(rec: Dict[str, Any]):
+  validate_audit_payload(rec)
+
+  # Check for duplicates: same location + day_of_week
+  if rec.get("recurring"):
+    check_recurring_conflict(rec, [r for r in load_audited() if r.get("recurring")])
 
   try:
     if rec.get("audited"):
@@ -686,12 +1069,38 @@ def audit_record(rec: Dict[str, Any]):
     raise HTTPException(status_code=500, detail=f"Could not persist audit: {exc}") from exc
 
 
-@app.post("/rescue-log")
-def create_rescue_log(payload: Dict[str, Any]):
-  """Create a new rescue log entry in the rescue_logs table."""
-  if not USE_SUPABASE or not supabase:
-    raise HTTPException(status_code=500, detail="Supabase not configured")
+@app.post("/audit/batch")
+def audit_batch(recs: List[Dict[str, Any]]):
+  """Apply many /audit payloads with one upsert and at most one delete."""
+  for rec in recs:
+    validate_audit_payload(rec)
+
+  # A later payload for the same id wins, as it would with sequential calls
+  latest = {str(rec["id"]): rec for rec in recs}
+
+  if any(rec.get("recurring") for rec in latest.values()):
+    recurring_records = [r for r in load_audited() if r.get("recurring")]
+    for rec in latest.values():
+      if rec.get("recurring"):
+        # Earlier payloads in the batch count as existing events too
+        check_recurring_conflict(rec, recurring_records)
+        recurring_records.append(rec)
+
+  to_save = [rec for rec in latest.values() if rec.get("audited")]
+  to_delete = [rec.get("id") for rec in latest.values() if not rec.get("audited")]
+  try:
+    save_audited_records(to_save)
+    delete_audited_records(to_delete)
+  except Exception as exc:
+    raise HTTPException(status_code=500, detail=f"Could not persist audits: {exc}") from exc
+  return {
+    "status": "ok",
+    "results": [{"id": rec.get("id"), "audited": bool(rec.get("audited"))} for rec in latest.values()],
+  }
+
 
+def rescue_log_row(payload: Dict[str, Any]) -> Dict[str, Any]:
+  """Validate a /rescue-log payload and build its rescue_logs row."""
   # Validate required fields
   if not payload.get("location"):
     raise HTTPException(status_code=400, detail="Missing required field: location")
@@ -708,17 +1117,29 @@ def create_rescue_log(payload: Dict[str, Any]):
   # Calculate total estimated lbs
   total_lbs = sum(float(item.get("estimated_lbs") or 0) for item in items_with_weights)
 
+  return {
+    "location": payload.get("location"),
+    "drop_off": payload.get("drop_off"),
+    "rescued_at": payload.get("rescued_at"),
+    "rescued_by": payload.get("rescued_by"),
+    "items": items_with_weights,
+    "total_estimated_lbs": round(total_lbs, 1) if total_lbs > 0 else None,
+    "notes": payload.get("notes"),
+    "source": payload.get("source", "manual"),
+  }
+
+
+@app.post("/rescue-log")
+def create_rescue_log(payload: Dict[str, Any]):
+  """Create a new rescue log entry in the rescue_logs table."""
+  if not USE_SUPABASE or not supabase:
+    raise HTTPException(status_code=500, detail="Supabase not configured")
+
+  row = rescue_log_row(payload)
+
   try:
-    result = supabase.table("rescue_logs").insert({
-      "location": payload.get("location"),
-      "drop_off": payload.get("drop_off"),
-      "rescued_at": payload.get("rescued_at"),
-      "rescued_by": payload.get("rescued_by"),
-      "items": items_with_weights,
-      "total_estimated_lbs": round(total_lbs, 1) if total_lbs > 0 else None,
-      "notes": payload.get("notes"),
-      "source": payload.get("source", "manual"),
-    }).execute()
+    result = supabase.table("rescue_logs").insert(row).execute()
+    clear_audited_cache()
 
     new_id = result.data[0]["id"] if result.data else None
     return {"status": "ok", "id": new_id}
@@ -726,6 +1147,25 @@ def create_rescue_log(payload: Dict[str, Any]):
     raise HTTPException(status_code=500, detail=f"Could not save rescue log: {exc}") from exc
 
 
+@app.post("/rescue-log/batch")
+def create_rescue_logs(payloads: List[Dict[str, Any]]):
+  """Create several rescue log entries with one insert; ids come back in payload order."""
+  if not USE_SUPABASE or not supabase:
+    raise HTTPException(status_code=500, detail="Supabase not configured")
+
+  rows = [rescue_log_row(payload) for payload in payloads]
+  if not rows:
+    return {"status": "ok", "ids": []}
+
+  try:
+    result = supabase.table("rescue_logs").insert(rows).execute()
+    clear_audited_cache()
+
+    return {"status": "ok", "ids": [row["id"] for row in result.data or []]}
+  except Exception as exc:
+    raise HTTPException(status_code=500, detail=f"Could not save rescue logs: {exc}") from exc
+
+
 @app.get("/health")
 def health():
   return {"status": "ok", "total": len(RECORDS)}
@@ -738,8 +1178,7 @@ WEIGHT_CONFIG_PATH = pathlib.Path(__file__).parent / "weight_config.json"
 def _load_weight_config_from_file():
   """Load weight config from local JSON file (for seeding)."""
   if WEIGHT_CONFIG_PATH.exists():
-    with open(WEIGHT_CONFIG_PATH, "r", encoding="utf-8") as f:
-      return json.load(f)
+    return orjson.loads(WEIGHT_CONFIG_PATH.read_bytes())
   return {
     "base": {},
     "unit_overrides": {},
@@ -842,10 +1281,14 @@ def get_inferencer():
   """Lazy-load inferencer singleton."""
   global _CACHED_INFERENCER
   if _CACHED_INFERENCER is None:
+    # Heavy (torch/transformers), so only imported on first use
     try:
       from infer import SlackMessageInferencer
       from manage_models import ModelRegistry
+    except ImportError as exc:
+      raise HTTPException(status_code=503, detail=f"Model dependencies not installed: {exc}") from exc
 
+    try:
       registry = ModelRegistry()
       adapter_path = registry.get_adapter_path("active")
 
@@ -883,7 +1326,8 @@ def run_inference(request: Dict[str, Any]):
 @app.get("/compare/{record_id}")
 def compare_extractions(record_id: int):
   """Compare regex vs model extraction for a record."""
-  record = next((r for r in RECORDS if r.get("id") == record_id), None)
+  idx = RECORD_INDEX_BY_ID.get(record_id)
+  record = RECORDS[idx] if idx is not None else None
   if not record:
     raise HTTPException(status_code=404, detail=f"Record {record_id} not found")
 
@@ -0,0 +1,55 @@
+"""
+Tests for export_slack_audited.py command-line behaviour.
+
+Run with: python -m pytest training/peft/test_export_slack_audited.py -v
+"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent / "export_slack_audited.py"
+
+
+def write_records(path, count):
+    """Write `count` audited records, every other one without items."""
+    with path.open("w", encoding="utf-8") as f:
+        for idx in range(count):
+            items = [{"name": "apples", "quantity": 2, "unit": "case"}] if idx % 2 == 0 else []
+            record = {
+                "id": idx,
+                "raw_text": f"Picked up 2 cases apples from Aldi #{idx}",
+                "rescue_location": "Aldi",
+                "items": items,
+            }
+            f.write(json.dumps(record) + "\n")
+
+
+class TestExportWorkers:
+    """Tests for --workers combined with --max-records."""
+
+    def test_max_records_with_workers_exits(self, tmp_path):
+        """Stopping early must shut the pool down instead of hanging."""
+        input_path = tmp_path / "audited.jsonl"
+        output_path = tmp_path / "out.jsonl"
+        aliases_path = tmp_path / "aliases.json"
+        write_records(input_path, 3000)
+        aliases_path.write_text("{}", encoding="utf-8")
+
+        subprocess.run(
+            [
+                sys.executable, str(SCRIPT),
+                "--input", str(input_path),
+                "--output", str(output_path),
+                "--aliases", str(aliases_path),
+                "--workers", "2",
+                "--max-records", "1",
+            ],
+            check=True,
+            capture_output=True,
+            timeout=60,
+        )
+
+        rows = output_path.read_text(encoding="utf-8").splitlines()
+        assert len(rows) == 1
+        assert json.loads(rows[0])["target"]["items"]
@@ -0,0 +1,25 @@
+"""
+Tests for item parsing in extract_slack_regex.py.
+
+Run with: python -m pytest training/peft/test_extract_slack_regex.py -v
+"""
+from extract_slack_regex import parse_items
+
+
+class TestParseItems:
+    """Tests for ITEM_PATTERN-driven item rows."""
+
+    def test_trailing_shopping_bags_is_not_an_item(self):
+        """A segment that ends at the unit has no item name."""
+        assert parse_items("Rescued 2 shopping bags") == []
+        assert parse_items("Rescued 2 shopping bag") == []
+
+    def test_shopping_bags_unit_keeps_item(self):
+        """"shopping bags" still works as a unit in front of a name."""
+        items = parse_items("Rescued 2 shopping bags of apples")
+        assert [(i.name, i.quantity, i.unit) for i in items] == [("apples", 2.0, "bag")]
+
+    def test_units_match_whole_words(self):
+        """A unit spelling inside a longer word is left in the name."""
+        items = parse_items("2 canned beans, 5 gallons milk")
+        assert [(i.name, i.unit) for i in items] == [("canned beans", None), ("milk", "gallon")]
@@ -115,6 +115,43 @@ class TestRescueLogValidation:
         assert response.status_code == 200
 
 
+class TestRescueLogBatch:
+    """Tests for the /rescue-log/batch endpoint."""
+
+    def test_batch_inserts_once(self, client, mock_supabase):
+        """All entries should go to Supabase in a single insert."""
+        ids = [str(uuid.uuid4()), str(uuid.uuid4())]
+        insert = mock_supabase.table.return_value.insert
+        insert.return_value.execute.return_value = MagicMock(data=[{"id": i} for i in ids])
+
+        payload = [
+            {"location": "Aldi Wicker Park", "rescued_at": "2024-01-04", "items": []},
+            {"location": "Jewel Osco", "rescued_at": "2024-01-05",
+             "items": [{"name": "Bread", "quantity": 10, "unit": "loaves", "estimated_lbs": 15}]},
+        ]
+
+        response = client.post("/rescue-log/batch", json=payload)
+        assert response.status_code == 200
+        assert response.json()["ids"] == ids
+
+        insert.assert_called_once()
+        rows = insert.call_args[0][0]
+        assert [row["location"] for row in rows] == ["Aldi Wicker Park", "Jewel Osco"]
+        assert rows[1]["total_estimated_lbs"] == 15.0
+
+    def test_invalid_entry_rejects_batch(self, client, mock_supabase):
+        """One invalid entry should reject the whole batch before inserting."""
+        payload = [
+            {"location": "Aldi Wicker Park", "rescued_at": "2024-01-04", "items": []},
+            {"rescued_at": "2024-01-05", "items": []},
+        ]
+
+        response = client.post("/rescue-log/batch", json=payload)
+        assert response.status_code == 400
+        assert "location" in response.json()["detail"].lower()
+        mock_supabase.table.return_value.insert.assert_not_called()
+
+
 class TestRescueLogDataStructure:
     """Tests for rescue_logs data structure expectations."""
 
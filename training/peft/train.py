@@ -3,14 +3,15 @@ import json
 import os
 from pathlib import Path
 
+import numpy as np
 import torch
-from datasets import load_dataset
+from datasets import Dataset, load_dataset
 from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training
 from transformers import (
     AutoModelForCausalLM,
     AutoTokenizer,
     BitsAndBytesConfig,
-    DataCollatorForLanguageModeling,
+    DataCollatorWithFlattening,
     Trainer,
     TrainingArguments,
 )
@@ -36,10 +37,21 @@ def parse_args():
     parser.add_argument("--gradient-accumulation", type=int, default=4, help="Gradient accumulation steps")
     parser.add_argument("--learning-rate", type=float, default=2e-4, help="AdamW learning rate")
     parser.add_argument("--weight-decay", type=float, default=0.0, help="Weight decay")
+    parser.add_argument(
+        "--optim",
+        default=None,
+        help="Trainer optimizer (default: paged_adamw_8bit when quantized, else adamw_torch_fused)",
+    )
     parser.add_argument("--warmup-steps", type=int, default=50, help="Warmup steps")
     parser.add_argument("--max-length", type=int, default=1024, help="Max sequence length")
     parser.add_argument("--eval-ratio", type=float, default=0.05, help="Portion of data to hold out for eval (0 disables)")
     parser.add_argument("--max-records", type=int, default=None, help="Optional cap on records for quick smoke tests")
+    parser.add_argument(
+        "--num-proc",
+        type=int,
+        default=min(16, os.cpu_count() or 1),
+        help="Worker processes for dataset formatting/tokenization",
+    )
     parser.add_argument("--lora-r", type=int, default=32, help="LoRA rank")
     parser.add_argument("--lora-alpha", type=int, default=64, help="LoRA alpha")
     parser.add_argument("--lora-dropout", type=float, default=0.05, help="LoRA dropout")
@@ -49,10 +61,40 @@ def parse_args():
         default=None,
         help="Comma-separated module names (defaults to common Llama attention/MLP projections)",
     )
-    parser.add_argument("--use-4bit", action="store_true", help="Load base model in 4-bit (requires bitsandbytes)")
+    parser.add_argument(
+        "--use-4bit",
+        action="store_true",
+        help=(
+            "QLoRA: load base model in 4-bit NF4 (requires bitsandbytes). Cuts base-weight memory ~4x "
+            "but runs slower per token than bf16 on ~1B models; use it to fit larger batches or GPUs"
+        ),
+    )
     parser.add_argument("--use-8bit", action="store_true", help="Load base model in 8-bit (requires bitsandbytes)")
     parser.add_argument("--grad-checkpointing", action="store_true", help="Enable gradient checkpointing")
+    parser.add_argument(
+        "--ckpt-stride",
+        type=int,
+        default=1,
+        help="With --grad-checkpointing, only checkpoint every Nth decoder layer (1 = all layers)",
+    )
+    parser.add_argument(
+        "--attn-impl",
+        default="flash_attention_2",
+        choices=["flash_attention_2", "sdpa", "eager"],
+        help="Attention kernel (falls back to sdpa if flash-attn is unavailable)",
+    )
+    parser.add_argument("--compile", action="store_true", help="torch.compile the model forward (ignored with --use-4bit)")
+    parser.add_argument(
+        "--packing",
+        action="store_true",
+        help="Pack each batch into one padding-free sequence (requires FlashAttention-2)",
+    )
     parser.add_argument("--prompt-template", type=str, default=DEFAULT_PROMPT_TEMPLATE, help="Custom prompt with {input_text} placeholder")
+    parser.add_argument(
+        "--save-final-only",
+        action="store_true",
+        help="Skip per-epoch checkpoints and only save the adapter once training finishes",
+    )
     parser.add_argument("--wandb", action="store_true", help="Report metrics to Weights & Biases")
     return parser.parse_args()
 
@@ -61,27 +103,125 @@ def guess_lora_modules():
     return ["q_proj", "k_proj", "v_proj", "o_proj", "gate_proj", "up_proj", "down_proj"]
 
 
+def resolve_attn_impl(requested):
+    if requested != "flash_attention_2":
+        return requested
+    if not torch.cuda.is_available():
+        print("FlashAttention-2 needs a CUDA GPU; using sdpa attention")
+        return "sdpa"
+    try:
+        import flash_attn  # noqa: F401
+    except ImportError:
+        print("flash-attn is not installed; using sdpa attention")
+        return "sdpa"
+    return requested
+
+
+def checkpoint_every_nth_layer(model, stride):
+    # Non-reentrant torch checkpointing on a subset of decoder layers; the rest
+    # keep their activations, trading some memory back for less recompute.
+    from torch.utils.checkpoint import checkpoint
+
+    for layer in model.get_base_model().model.layers[::stride]:
+        def _forward(*args, _layer_forward=layer.forward, **kwargs):
+            return checkpoint(_layer_forward, *args, use_reentrant=False, **kwargs)
+
+        layer.forward = _forward
+
+
 def make_formatter(tokenizer, template):
-    def _format(example):
-        prompt = example.get("prompt") or template.format(input_text=example["input_text"].strip())
-        target_text = example.get("response") or json.dumps(example.get("target") or {}, ensure_ascii=False)
-        text = prompt.rstrip() + "\n" + target_text + tokenizer.eos_token
-        return {"text": text}
+    eos = tokenizer.eos_token
+
+    def _format(batch):
+        size = len(next(iter(batch.values())))
+        columns = [batch.get(name) or [None] * size for name in ("prompt", "input_text", "response", "target")]
+        prompts, completions = [], []
+        for prompt, input_text, response, target in zip(*columns):
+            prompt = prompt or template.format(input_text=input_text.strip())
+            target_text = response or json.dumps(target or {}, ensure_ascii=False)
+            prompts.append(prompt.rstrip() + "\n")
+            completions.append(target_text + eos)
+        return {"prompt": prompts, "completion": completions}
 
     return _format
 
 
-def tokenize(tokenizer, max_length):
+def prompt_encoder(tokenizer, template):
+    # The template text before {input_text} is the same for every row, so it is
+    # tokenized once and only the rest of each prompt goes through the tokenizer.
+    prefix = template.format(input_text="\0").split("\0", 1)[0]
+    prefix_ids = tokenizer(prefix)["input_ids"]
+    probe = prefix + "Picked up 5 cases bananas"
+    probe_tail = tokenizer(probe[len(prefix):], add_special_tokens=False)["input_ids"]
+    if not prefix or tokenizer(probe)["input_ids"] != prefix_ids + probe_tail:
+        # The tokenizer merges across the split point; encode whole prompts
+        return lambda prompts: tokenizer(prompts)["input_ids"]
+
+    def _encode(prompts):
+        encoded = [None] * len(prompts)
+        shared = [i for i, prompt in enumerate(prompts) if prompt.startswith(prefix)]
+        other = [i for i, prompt in enumerate(prompts) if not prompt.startswith(prefix)]
+        if shared:
+            tails = tokenizer([prompts[i][len(prefix):] for i in shared], add_special_tokens=False)["input_ids"]
+            for i, ids in zip(shared, tails):
+                encoded[i] = prefix_ids + ids
+        if other:
+            for i, ids in zip(other, tokenizer([prompts[i] for i in other])["input_ids"]):
+                encoded[i] = ids
+        return encoded
+
+    return _encode
+
+
+def tokenize(tokenizer, max_length, template):
+    encode_prompts = prompt_encoder(tokenizer, template)
+
+    # Prompt positions get label -100 so loss is only computed on the JSON target.
+    # Rows whose prompt alone fills max_length would have no target tokens left
+    # after truncation (no loss, and a NaN eval loss if a batch is all such rows),
+    # so they are dropped.
     def _tokenize(batch):
-        return tokenizer(
-            batch["text"],
-            truncation=True,
-            max_length=max_length,
-        )
+        prompt_ids = encode_prompts(batch["prompt"])
+        completion_ids = tokenizer(batch["completion"], add_special_tokens=False)["input_ids"]
+        input_ids, attention_mask, labels = [], [], []
+        for prompt, completion in zip(prompt_ids, completion_ids):
+            if len(prompt) >= max_length:
+                continue
+            ids = (prompt + completion)[:max_length]
+            input_ids.append(ids)
+            attention_mask.append([1] * len(ids))
+            labels.append(([-100] * len(prompt) + completion)[:max_length])
+        lengths = [len(ids) for ids in input_ids]
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels, "length": lengths}
 
     return _tokenize
 
 
+class PaddedCollator:
+    """Right-pad a batch into preallocated numpy arrays and hand them to torch without copies."""
+
+    def __init__(self, pad_token_id, pad_to_multiple_of=8):
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features):
+        longest = max(len(f["input_ids"]) for f in features)
+        width = -(-longest // self.pad_to_multiple_of) * self.pad_to_multiple_of
+        input_ids = np.full((len(features), width), self.pad_token_id, dtype=np.int64)
+        labels = np.full((len(features), width), -100, dtype=np.int64)
+        attention_mask = np.zeros((len(features), width), dtype=np.int64)
+        for row, feature in enumerate(features):
+            size = len(feature["input_ids"])
+            input_ids[row, :size] = feature["input_ids"]
+            labels[row, :size] = feature["labels"]
+            attention_mask[row, :size] = 1
+        return {
+            "input_ids": torch.from_numpy(input_ids),
+            "attention_mask": torch.from_numpy(attention_mask),
+            "labels": torch.from_numpy(labels),
+        }
+
+
 def get_quant_config(args):
     if not (args.use_4bit or args.use_8bit):
         return None
@@ -102,23 +242,35 @@ def main():
     Path(args.output_dir).mkdir(parents=True, exist_ok=True)
 
     torch.backends.cuda.matmul.allow_tf32 = True
+    torch.backends.cudnn.allow_tf32 = True
     tokenizer = AutoTokenizer.from_pretrained(args.model_id, use_fast=True)
     if tokenizer.pad_token is None:
         tokenizer.pad_token = tokenizer.eos_token
     tokenizer.padding_side = "right"
 
     quant_config = get_quant_config(args)
+    attn_impl = resolve_attn_impl(args.attn_impl)
     model_kwargs = {
-        "device_map": "auto",
-        "torch_dtype": torch.bfloat16 if not (args.use_4bit or args.use_8bit) else None,
+        # A single GPU needs no accelerate dispatch hooks on every module
+        "device_map": {"": 0} if torch.cuda.device_count() == 1 else "auto",
+        # Also the dtype of the layers bitsandbytes leaves unquantized (embeddings, lm_head)
+        "torch_dtype": torch.bfloat16,
         "quantization_config": quant_config,
+        "attn_implementation": attn_impl,
     }
 
     model = AutoModelForCausalLM.from_pretrained(args.model_id, **model_kwargs)
+    # HF checkpointing covers every layer; a stride > 1 is handled after the adapter is attached
+    full_checkpointing = args.grad_checkpointing and args.ckpt_stride <= 1
     if quant_config:
-        model = prepare_model_for_kbit_training(model)
+        model = prepare_model_for_kbit_training(
+            model,
+            use_gradient_checkpointing=full_checkpointing,
+            gradient_checkpointing_kwargs={"use_reentrant": False},
+        )
+    if full_checkpointing:
+        model.gradient_checkpointing_enable(gradient_checkpointing_kwargs={"use_reentrant": False})
     if args.grad_checkpointing:
-        model.gradient_checkpointing_enable()
         model.config.use_cache = False
 
     target_modules = (
@@ -137,10 +289,15 @@ def main():
     )
     model = get_peft_model(model, lora_config)
     model.print_trainable_parameters()
+    if args.grad_checkpointing and not full_checkpointing:
+        checkpoint_every_nth_layer(model, args.ckpt_stride)
 
-    raw = load_dataset("json", data_files=args.dataset)["train"]
     if args.max_records:
-        raw = raw.select(range(min(len(raw), args.max_records)))
+        # Stream just the first rows instead of converting the whole JSONL to Arrow
+        stream = load_dataset("json", data_files=args.dataset, streaming=True)["train"]
+        raw = Dataset.from_list(list(stream.take(args.max_records)))
+    else:
+        raw = load_dataset("json", data_files=args.dataset)["train"]
 
     if args.eval_ratio and args.eval_ratio > 0:
         split = raw.train_test_split(test_size=args.eval_ratio, seed=42)
@@ -148,18 +305,41 @@ def main():
     else:
         train_ds, eval_ds = raw, None
 
+    # The fast tokenizer's own thread pool would oversubscribe the map workers
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    map_kwargs = {"batched": True, "batch_size": 1000, "num_proc": args.num_proc}
     formatter = make_formatter(tokenizer, args.prompt_template)
-    train_ds = train_ds.map(formatter, remove_columns=train_ds.column_names)
-    eval_ds = eval_ds.map(formatter, remove_columns=eval_ds.column_names) if eval_ds else None
+    train_ds = train_ds.map(formatter, remove_columns=train_ds.column_names, **map_kwargs)
+    eval_ds = eval_ds.map(formatter, remove_columns=eval_ds.column_names, **map_kwargs) if eval_ds else None
 
-    train_ds = train_ds.map(tokenize(tokenizer, args.max_length), batched=True, remove_columns=train_ds.column_names)
+    tokenizer_fn = tokenize(tokenizer, args.max_length, args.prompt_template)
+    formatted_counts = (len(train_ds), len(eval_ds) if eval_ds else 0)
+    train_ds = train_ds.map(tokenizer_fn, remove_columns=train_ds.column_names, **map_kwargs)
     eval_ds = (
-        eval_ds.map(tokenize(tokenizer, args.max_length), batched=True, remove_columns=eval_ds.column_names)
+        eval_ds.map(tokenizer_fn, remove_columns=eval_ds.column_names, **map_kwargs)
         if eval_ds
         else None
     )
-
-    data_collator = DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)
+    dropped = formatted_counts[0] - len(train_ds) + formatted_counts[1] - (len(eval_ds) if eval_ds else 0)
+    if dropped:
+        print(f"Dropped {dropped} rows whose prompt fills --max-length {args.max_length} (no target tokens left)")
+    if eval_ds is not None and len(eval_ds) == 0:
+        eval_ds = None
+
+    # bitsandbytes 4-bit kernels recompile on every new shape, so compile only pays off unquantized
+    compile_model = args.compile and not args.use_4bit
+    if args.compile and not compile_model:
+        print("Skipping torch.compile for a 4-bit model")
+
+    packing = args.packing and attn_impl == "flash_attention_2"
+    if packing:
+        # Examples are concatenated with position_ids restarting at each one, so
+        # FA2's varlen kernels keep them from attending across boundaries.
+        data_collator = DataCollatorWithFlattening(return_position_ids=True, separator_id=-100)
+    else:
+        if args.packing:
+            print("Packing needs FlashAttention-2; padding batches instead")
+        data_collator = PaddedCollator(tokenizer.pad_token_id)
 
     logging_dir = os.path.join(args.output_dir, "logs")
     training_args = TrainingArguments(
@@ -170,14 +350,27 @@ def main():
         max_steps=args.max_steps or -1,
         learning_rate=args.learning_rate,
         weight_decay=args.weight_decay,
+        optim=args.optim or ("paged_adamw_8bit" if quant_config else "adamw_torch_fused"),
         warmup_steps=args.warmup_steps,
         lr_scheduler_type="cosine",
         logging_steps=10,
-        save_strategy="epoch",
+        save_strategy="no" if args.save_final_only else "epoch",
+        save_safetensors=True,
         evaluation_strategy="steps" if eval_ds is not None else "no",
         eval_steps=200 if eval_ds is not None else None,
-        bf16=not (args.use_4bit or args.use_8bit),
-        gradient_checkpointing=args.grad_checkpointing,
+        # Batch similar-length examples to cut padding; packing has none to cut
+        group_by_length=not packing,
+        length_column_name="length",
+        # Autocast quantized runs too, so LoRA matmuls run in bf16 like the bnb compute dtype
+        bf16=not torch.cuda.is_available() or torch.cuda.is_bf16_supported(),
+        gradient_checkpointing=full_checkpointing,
+        gradient_checkpointing_kwargs={"use_reentrant": False},
+        # Collate the next batches in background workers while the GPU runs the current step
+        dataloader_num_workers=2,
+        dataloader_persistent_workers=True,
+        dataloader_pin_memory=True,
+        torch_compile=compile_model,
+        torch_compile_backend="inductor" if compile_model else None,
         report_to=["wandb"] if args.wandb else ["none"],
         logging_dir=logging_dir,
     )
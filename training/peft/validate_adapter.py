@@ -30,15 +30,29 @@ DEFAULT_SAMPLES = [
 ]
 
 
-def load_model_and_tokenizer(adapter_path: Path):
+def resolve_attn_impl(requested: str) -> str:
+    """Fall back to SDPA attention when FlashAttention-2 can't run here."""
+    if requested != "flash_attention_2":
+        return requested
+    if not torch.cuda.is_available():
+        return "sdpa"
+    try:
+        import flash_attn  # noqa: F401
+    except ImportError:
+        print("flash-attn is not installed; using sdpa attention")
+        return "sdpa"
+    return requested
+
+
+def load_model_and_tokenizer(adapter_path: Path, attn_impl: str = "flash_attention_2", merge_adapter: bool = True):
     """Load base model with LoRA adapter."""
     print(f"Loading model from {adapter_path}...")
 
     base_model_id = "meta-llama/Llama-3.2-1B-Instruct"
 
     try:
-        # Load tokenizer
-        tokenizer = AutoTokenizer.from_pretrained(base_model_id)
+        # Load tokenizer (left padding so batched generation continues each prompt)
+        tokenizer = AutoTokenizer.from_pretrained(base_model_id, padding_side="left")
         if tokenizer.pad_token is None:
             tokenizer.pad_token = tokenizer.eos_token
 
@@ -46,12 +60,20 @@ def load_model_and_tokenizer(adapter_path: Path):
         model = AutoModelForCausalLM.from_pretrained(
             base_model_id,
             torch_dtype=torch.bfloat16,
-            device_map="auto",
+            device_map={"": 0} if torch.cuda.device_count() == 1 else "auto",
             low_cpu_mem_usage=True,
+            attn_implementation=resolve_attn_impl(attn_impl),
         )
 
         # Load adapter
         model = PeftModel.from_pretrained(model, str(adapter_path))
+        if merge_adapter:
+            # Fold the LoRA deltas into the bf16 base weights so each projection
+            # is a single matmul during generation
+            model = model.merge_and_unload()
+        model.eval()
+        # Adapters trained with gradient checkpointing save use_cache=False
+        model.config.use_cache = True
 
         print("✓ Model and adapter loaded successfully")
         return model, tokenizer
@@ -75,30 +97,34 @@ def build_prompt(message_text: str) -> str:
     )
 
 
-def run_inference(model, tokenizer, message: str) -> str:
-    """Run inference on a single message."""
-    prompt = build_prompt(message)
+def run_inference(
+    model,
+    tokenizer,
+    messages: List[str],
+    temperature: float = 0.0,
+    max_new_tokens: int = 512,
+) -> List[str]:
+    """Run inference on a batch of messages in one generate call (greedy unless temperature > 0)."""
+    prompts = [build_prompt(message) for message in messages]
 
-    inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+    inputs = tokenizer(prompts, return_tensors="pt", padding=True).to(model.device)
 
-    with torch.no_grad():
+    sampling = {"do_sample": True, "temperature": temperature} if temperature > 0 else {"do_sample": False}
+
+    with torch.inference_mode():
         outputs = model.generate(
             **inputs,
-            max_new_tokens=512,
-            temperature=0.1,
-            do_sample=True,
+            max_new_tokens=max_new_tokens,
+            **sampling,
+            use_cache=True,
             pad_token_id=tokenizer.pad_token_id,
             eos_token_id=tokenizer.eos_token_id,
         )
 
-    # Decode and extract JSON (everything after the prompt)
-    full_output = tokenizer.decode(outputs[0], skip_special_tokens=True)
-    if "JSON:" in full_output:
-        json_output = full_output.split("JSON:")[-1].strip()
-    else:
-        json_output = full_output[len(prompt):].strip()
-
-    return json_output
+    # Everything after the (left-padded) prompt is the generated JSON
+    prompt_len = inputs["input_ids"].shape[1]
+    generated = tokenizer.batch_decode(outputs[:, prompt_len:], skip_special_tokens=True)
+    return [text.strip() for text in generated]
 
 
 def validate_json_output(output: str) -> tuple[bool, Dict[str, Any] | None, str]:
@@ -146,6 +172,35 @@ def main():
         action="store_true",
         help="Print full inference outputs",
     )
+    parser.add_argument(
+        "--batch",
+        type=int,
+        default=8,
+        help="Number of samples to generate per batch",
+    )
+    parser.add_argument(
+        "--temperature",
+        type=float,
+        default=0.0,
+        help="Sampling temperature (0 = deterministic greedy decoding)",
+    )
+    parser.add_argument(
+        "--max-new-tokens",
+        type=int,
+        default=512,
+        help="Generation cap per sample",
+    )
+    parser.add_argument(
+        "--keep-adapter",
+        action="store_true",
+        help="Run with the LoRA adapter unmerged (slower, matches the training graph)",
+    )
+    parser.add_argument(
+        "--attn-impl",
+        default="flash_attention_2",
+        choices=["flash_attention_2", "sdpa", "eager"],
+        help="Attention kernel (falls back to sdpa if flash-attn is unavailable)",
+    )
     args = parser.parse_args()
 
     # Find adapter path
@@ -178,7 +233,7 @@ def main():
 
     # Load model
     try:
-        model, tokenizer = load_model_and_tokenizer(adapter_path)
+        model, tokenizer = load_model_and_tokenizer(adapter_path, args.attn_impl, not args.keep_adapter)
     except Exception:
         return False
 
@@ -186,11 +241,24 @@ def main():
     print(f"\nRunning inference on {len(samples)} sample messages...\n")
 
     all_valid = True
-    for idx, message in enumerate(samples, 1):
-        print(f"Sample {idx}: {message[:80]}{'...' if len(message) > 80 else ''}")
-
+    batch_size = max(1, args.batch)
+    for start in range(0, len(samples), batch_size):
+        batch = samples[start:start + batch_size]
         try:
-            output = run_inference(model, tokenizer, message)
+            outputs = run_inference(model, tokenizer, batch, args.temperature, args.max_new_tokens)
+            error = None
+        except Exception as e:
+            outputs = [None] * len(batch)
+            error = e
+
+        for idx, (message, output) in enumerate(zip(batch, outputs), start + 1):
+            print(f"Sample {idx}: {message[:80]}{'...' if len(message) > 80 else ''}")
+
+            if error is not None:
+                print(f"  ✗ Inference failed: {error}")
+                all_valid = False
+                print()
+                continue
 
             if args.verbose:
                 print(f"  Output: {output}")
@@ -207,11 +275,7 @@ def main():
                     print(f"    Parsed data: {json.dumps(data, indent=2)}")
                 all_valid = False
 
-        except Exception as e:
-            print(f"  ✗ Inference failed: {e}")
-            all_valid = False
-
-        print()
+            print()
 
     # Summary
     print("=" * 50)